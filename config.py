@@ -46,9 +46,73 @@ IMMICH_TARGET_ALBUM_ID = "fa588b80-6b40-4607-8d6c-cd90101db9e9"
 GALLERY_STORAGE_DIR = os.path.join(os.path.dirname(__file__), 'storage', 'gallery')
 # 缓存图片存储目录（持久保存）
 GALLERY_CACHE_DIR = os.path.join(os.path.dirname(__file__), 'storage', 'gallery_cache')
+# 缩略图 / 尺寸变体缓存总大小上限（字节），超出后按 LRU 淘汰
+GALLERY_CACHE_MAX_BYTES = int(os.getenv("GALLERY_CACHE_MAX_BYTES", str(1024 * 1024 * 1024)))
+# /api/image?w= 允许的宽度档位，请求宽度向上取整到最近一档，避免缓存被任意尺寸撑爆
+IMAGE_VARIANT_WIDTHS = (160, 320, 640, 1080)
+# 尺寸变体的编码质量
+IMAGE_VARIANT_QUALITY = 80
+# 入库时生成的缩略图宽度（存放在 GALLERY_CACHE_DIR 根目录，经 /api/image/gallery_cache/ 访问）
+UPLOAD_THUMB_WIDTH = 320
 # 水印图片存储目录（定时清理）
 WATERMARK_STORAGE_DIR = os.path.join(os.path.dirname(__file__), 'storage', 'watermark')
 
+# ==================== 文件传输配置 ====================
+# 文件字节的发送方式：
+#   send_file: Flask 直接发送（开发环境默认）
+#   x-accel:   只返回 X-Accel-Redirect 头，由 nginx internal location 发送文件，不占用 gunicorn 线程
+FILE_SERVING_MODE = os.getenv("FILE_SERVING_MODE", "send_file")
+# x-accel 模式下本地目录与 nginx internal location 的对应关系，不在表内的文件回退到 send_file
+X_ACCEL_LOCATIONS = {
+    os.path.join(os.path.dirname(__file__), 'storage'): "/_protected/storage",
+    os.path.join(os.path.dirname(__file__), 'apks'): "/_protected/apks",
+}
+
+# ==================== 水印进程池配置 ====================
+# 每个 gunicorn worker 持有一个常驻进程池，进程数 = WATERMARK_POOL_SIZE（<=1 时在请求线程内串行处理）
+WATERMARK_POOL_SIZE = int(os.getenv("WATERMARK_POOL_SIZE", str(min(2, os.cpu_count() or 1))))
+# 单次请求等待整批水印完成的最长秒数，需小于 gunicorn timeout(30s)
+WATERMARK_POOL_TIMEOUT = float(os.getenv("WATERMARK_POOL_TIMEOUT", "25"))
+
+# 水印图片 JPEG 输出质量
+WATERMARK_JPEG_QUALITY = 85
+# 按目标大小压缩时允许降到的最低质量
+WATERMARK_MIN_JPEG_QUALITY = 60
+# 水印结果进程内读缓存：池子进程写好文件并传回字节后，刚生成的图片在 TTL 内由本 worker 直接从内存返回
+RESULT_STORE_ENABLED = os.getenv("RESULT_STORE_ENABLED", "1") == "1"
+RESULT_STORE_TTL_SECONDS = int(os.getenv("RESULT_STORE_TTL_SECONDS", "300"))
+# 每个 gunicorn worker 的内存上限（字节）
+RESULT_STORE_MAX_BYTES = int(os.getenv("RESULT_STORE_MAX_BYTES", str(64 * 1024 * 1024)))
+# 工单图片上传 COS 前的大小上限（字节），0 表示不限制
+ORDER_PHOTO_MAX_BYTES = int(os.getenv("ORDER_PHOTO_MAX_BYTES", str(400 * 1024)))
+# /api/image 文件名索引检查目录 mtime 的最小间隔（秒）
+IMAGE_INDEX_POLL_SECONDS = float(os.getenv("IMAGE_INDEX_POLL_SECONDS", "5"))
+
+# ==================== 审核批量操作配置 ====================
+# 批量通过 / 拒绝 / 清除时并发移动目录的线程数
+REVIEW_BATCH_WORKERS = 4
+# 单次批量请求最多处理的条目数
+REVIEW_BATCH_MAX_ITEMS = 500
+
+# ==================== 存储清理配置（janitor_worker.py） ====================
+# 每个目录一条策略：
+#   max_age_days:  超过该天数未访问 / 修改的文件直接删除，None 不按时间清理
+#   max_bytes:     目录总大小上限，超出后按最近访问时间（LRU）删除，None 不限制
+#   recursive:     是否递归子目录（清理后顺带删除空目录）
+# storage/reviews 不在清理范围内：审核目录与 review_items 索引一一对应，只能通过审核接口增删
+JANITOR_POLICIES = [
+    {"dir": WATERMARK_STORAGE_DIR, "max_age_days": 3, "max_bytes": 2 * 1024 ** 3, "recursive": False},
+    {"dir": os.path.join(os.path.dirname(__file__), 'storage', 'failed_uploads'),
+     "max_age_days": 14, "max_bytes": 1024 ** 3, "recursive": False},
+]
+# 两轮清理之间的间隔（秒）
+JANITOR_INTERVAL_SECONDS = int(os.getenv("JANITOR_INTERVAL_SECONDS", "600"))
+# 每删除多少个文件暂停一次，以及暂停秒数，避免挤占请求 I/O
+JANITOR_BATCH_SIZE = 200
+JANITOR_BATCH_PAUSE_SECONDS = 0.2
+# 最近一轮清理统计
+JANITOR_STATS_FILE = os.path.join(os.path.dirname(__file__), 'storage', 'janitor_stats.json')
+
 # =========================
 # MySQL / Peewee 配置
 # =========================
@@ -88,6 +152,20 @@ SESSION_STATUS_UPLOADING = "UPLOADING"
 SESSION_STATUS_READY_TO_COMPLETE = "READY_TO_COMPLETE"
 SESSION_STATUS_COMPLETED = "COMPLETED"
 
+# 分片落盘的 fsync 策略：
+#   none:  不主动 fsync，交给 page cache 回写（默认，与原行为一致）
+#   chunk: 每个分片写完 fsync 后再返回，响应成功即已持久化
+#   merge: 分片不 fsync，合并完成后对最终文件 fsync 一次
+CHUNK_FSYNC_POLICY = os.getenv("CHUNK_FSYNC_POLICY", "none")
+# 分片存储方式：
+#   parts:       每个分片单独保存为 <fingerprint>_<n>.part，merge_worker 拼接（默认）
+#   preallocate: prepare 时预分配 <最终文件>.partial，分片按偏移直接写入，合并只需 fsync + rename
+CHUNK_STORAGE_MODE = os.getenv("CHUNK_STORAGE_MODE", "parts")
+# 流式写分片时复用的读缓冲大小（字节）
+CHUNK_IO_BUFFER_SIZE = 1024 * 1024
+# /api/upload/chunk/batch 单次请求最多携带的分片数
+CHUNK_BATCH_MAX_PARTS = 64
+
 # ==================== 日志配置 ====================
 LOGGING_CONFIG = {
     'version': 1,
@@ -301,6 +301,28 @@ class CompleteTask(BaseModel):
             return []
 
 
+class ReviewItem(BaseModel):
+    """
+    审核文件索引：与 storage/reviews/<status>/<file_path>/<filename> 一一对应，
+    审核通过 / 拒绝 / 清除时按 filename、file_path 直接定位，不再遍历目录树
+    """
+    id = AutoField()
+
+    filename = CharField(max_length=255, index=True)  # 审核文件名（一般为 md5 命名）
+    file_path = CharField(max_length=512)  # 原始业务路径，例如 /aaa/bbb/ccc/this_is_a_video.mp4
+    status = CharField(max_length=20, default="pending")  # pending / approve / reject
+
+    created_at = DateTimeField(default=lambda: datetime.now(TZ))
+    updated_at = DateTimeField(default=lambda: datetime.now(TZ))
+
+    class Meta:
+        table_name = "review_items"
+        indexes = (
+            (("file_path", "filename"), True),
+            (("status", "id"), False),
+        )
+
+
 # =========================
 # 连接 & 初始化函数
 # =========================
@@ -339,9 +361,15 @@ def create_tables_once():
     """
     init_database_connection()
     db.create_tables(
-        [UploadRecord, UploadTask, UserInfo, File, UploadSession, UploadPart, UserTemplatePic, CompleteTask],
+        [UploadRecord, UploadTask, UserInfo, File, UploadSession, UploadPart, UserTemplatePic, CompleteTask,
+         ReviewItem],
         safe=True,
     )
+
+    # 审核索引表首次创建时，从已有目录回填
+    if not ReviewItem.select().exists():
+        from utils.review_index import rebuild_review_index
+        rebuild_review_index()
     log_line("[INFO] MySQL 数据库表结构检查/初始化完成")
 
 
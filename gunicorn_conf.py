@@ -40,3 +40,18 @@ graceful_timeout = 30
 # 防止 worker 跑太久内存泄漏：达到一定请求数后自动重启
 max_requests = 1000
 max_requests_jitter = 100
+
+
+# ============================
+# Worker 生命周期钩子
+# ============================
+
+def post_worker_init(worker):
+    # 每个 worker 启动后预热常驻水印进程池（子进程内预加载字体 / turbojpeg / 固定图层）
+    from tasks.watermark_pool import warm_up_watermark_pool
+    warm_up_watermark_pool()
+
+
+def worker_exit(server, worker):
+    from tasks.watermark_pool import shutdown_watermark_pool
+    shutdown_watermark_pool()
@@ -0,0 +1,188 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import json
+import os
+import time
+import traceback
+from datetime import datetime
+
+from config import (
+    TZ,
+    JANITOR_POLICIES,
+    JANITOR_INTERVAL_SECONDS,
+    JANITOR_BATCH_SIZE,
+    JANITOR_BATCH_PAUSE_SECONDS,
+    JANITOR_STATS_FILE,
+)
+from utils.logger import log_line
+
+
+# =========================
+# 扫描 / 删除
+# =========================
+
+def scan_files(root: str, recursive: bool):
+    """
+    用 os.scandir 收集目录下的文件
+
+    :param root: 目录
+    :param recursive: 是否递归子目录
+    :returns: ([(last_used, size, path), ...], 子目录列表)
+    """
+    files = []
+    dirs = []
+    stack = [root]
+    while stack:
+        current = stack.pop()
+        try:
+            with os.scandir(current) as it:
+                for entry in it:
+                    try:
+                        if entry.is_dir(follow_symlinks=False):
+                            if recursive:
+                                stack.append(entry.path)
+                                dirs.append(entry.path)
+                            continue
+                        if not entry.is_file(follow_symlinks=False):
+                            continue
+                        st = entry.stat(follow_symlinks=False)
+                    except FileNotFoundError:
+                        continue
+                    # noatime 挂载下 atime 不更新，取 atime / mtime 较新者作为最近使用时间
+                    files.append((max(st.st_atime, st.st_mtime), st.st_size, entry.path))
+        except FileNotFoundError:
+            continue
+    return files, dirs
+
+
+class _Deleter:
+    """按批删除并限速"""
+
+    def __init__(self):
+        self.deleted = 0
+        self.freed = 0
+        self.errors = 0
+
+    def remove(self, path: str, size: int) -> None:
+        try:
+            os.remove(path)
+            self.deleted += 1
+            self.freed += size
+        except FileNotFoundError:
+            pass
+        except OSError as e:
+            self.errors += 1
+            log_line(f"[ERROR] [janitor] 删除失败: {path} -> {e}")
+            return
+
+        if self.deleted % JANITOR_BATCH_SIZE == 0:
+            time.sleep(JANITOR_BATCH_PAUSE_SECONDS)
+
+
+def remove_empty_dirs(root: str, dirs) -> int:
+    """自底向上删除空目录（不删除 root 本身）"""
+    removed = 0
+    for d in sorted(dirs, key=len, reverse=True):
+        if d == root:
+            continue
+        try:
+            os.rmdir(d)
+            removed += 1
+        except OSError:
+            pass
+    return removed
+
+
+def apply_policy(policy: dict) -> dict:
+    """
+    对单个目录执行清理策略：先删过期文件，再按 LRU 删到 max_bytes 以内
+
+    :param policy: JANITOR_POLICIES 中的一项
+    :returns: 本目录的统计信息
+    """
+    root = policy["dir"]
+    started = time.monotonic()
+    stats = {"dir": root, "files": 0, "bytes": 0, "deleted": 0, "freed_bytes": 0,
+             "errors": 0, "removed_dirs": 0}
+    if not os.path.isdir(root):
+        return stats
+
+    files, dirs = scan_files(root, policy.get("recursive", False))
+    stats["files"] = len(files)
+    stats["bytes"] = sum(f[1] for f in files)
+
+    deleter = _Deleter()
+    remaining = []
+    max_age_days = policy.get("max_age_days")
+    cutoff = time.time() - max_age_days * 86400 if max_age_days else None
+    for last_used, size, path in files:
+        if cutoff is not None and last_used < cutoff:
+            deleter.remove(path, size)
+        else:
+            remaining.append((last_used, size, path))
+
+    max_bytes = policy.get("max_bytes")
+    total = sum(f[1] for f in remaining)
+    if max_bytes is not None and total > max_bytes:
+        remaining.sort()
+        for last_used, size, path in remaining:
+            if total <= max_bytes:
+                break
+            deleter.remove(path, size)
+            total -= size
+
+    if dirs:
+        stats["removed_dirs"] = remove_empty_dirs(root, dirs)
+
+    stats.update(
+        deleted=deleter.deleted,
+        freed_bytes=deleter.freed,
+        errors=deleter.errors,
+        remaining_files=stats["files"] - deleter.deleted,
+        remaining_bytes=stats["bytes"] - deleter.freed,
+        elapsed_ms=round((time.monotonic() - started) * 1000, 1),
+    )
+    return stats
+
+
+def run_once() -> dict:
+    """执行一轮清理并写入统计文件"""
+    results = []
+    for policy in JANITOR_POLICIES:
+        try:
+            results.append(apply_policy(policy))
+        except Exception:
+            traceback.print_exc()
+            log_line(f"[ERROR] [janitor] 清理目录异常: {policy.get('dir')}")
+
+    report = {
+        "finished_at": datetime.now(TZ).strftime("%Y-%m-%d %H:%M:%S"),
+        "interval_seconds": JANITOR_INTERVAL_SECONDS,
+        "dirs": results,
+    }
+
+    os.makedirs(os.path.dirname(JANITOR_STATS_FILE), exist_ok=True)
+    tmp_path = f"{JANITOR_STATS_FILE}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+    os.replace(tmp_path, JANITOR_STATS_FILE)
+
+    deleted = sum(r["deleted"] for r in results)
+    freed = sum(r["freed_bytes"] for r in results)
+    log_line(f"[INFO] [janitor] 本轮清理完成: deleted={deleted}, freed={freed / 1024 / 1024:.1f}MB")
+    return report
+
+
+def main():
+    log_line("[INFO] [janitor] 存储清理任务已启动")
+    try:
+        while True:
+            run_once()
+            time.sleep(JANITOR_INTERVAL_SECONDS)
+    except KeyboardInterrupt:
+        log_line("[INFO] [janitor] 收到 KeyboardInterrupt，停止清理任务")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,8 +1,8 @@
 #!/usr/bin/env python
 # -*- coding: utf-8 -*-
 
+import errno
 import os
-import shutil
 import time
 import traceback
 
@@ -12,6 +12,7 @@ from config import (
     IMMICH_EXTERNAL_HOST_ROOT,
     IMMICH_EXTERNAL_CONTAINER_ROOT,
     FILE_STATUS_COMPLETED,
+    CHUNK_FSYNC_POLICY,
     SESSION_STATUS_READY_TO_COMPLETE,
     SESSION_STATUS_COMPLETED,
     SESSION_STATUS_UPLOADING, IMMICH_TARGET_ALBUM_ID,
@@ -56,6 +57,14 @@ def get_final_file_path(file: File) -> str:
     return os.path.join(IMMICH_EXTERNAL_HOST_ROOT, filename)
 
 
+def get_partial_path(file: File) -> str:
+    """
+    preallocate 模式下 prepare 时预分配、分片按偏移写入的文件路径：
+        /immich-external-library/<file.cos_key>.partial
+    """
+    return get_final_file_path(file) + ".partial"
+
+
 def get_immich_file_path(file: File) -> str:
     """
     构造最终合并后的immich的文件路径。
@@ -72,6 +81,94 @@ def get_immich_file_path(file: File) -> str:
 # 合并逻辑
 # =========================
 
+def _copy_range(in_fd: int, out_fd: int, size: int) -> str:
+    """
+    在内核内把 in_fd 的 size 字节追加到 out_fd 当前位置：
+    优先 copy_file_range（同文件系统可 reflink），其次 sendfile，最后退化为缓冲拷贝
+
+    :returns: 实际使用的方式，用于日志
+    :raises IOError: 源文件提前结束，实际拷贝不足 size 字节
+    """
+    copied = 0
+    method = "copy_file_range"
+    while copied < size:
+        try:
+            if method == "copy_file_range":
+                n = os.copy_file_range(in_fd, out_fd, size - copied)
+            elif method == "sendfile":
+                n = os.sendfile(out_fd, in_fd, None, size - copied)
+            else:
+                data = os.read(in_fd, min(size - copied, 1024 * 1024))
+                n = len(data)
+                view = memoryview(data)
+                while view:
+                    view = view[os.write(out_fd, view):]
+        except (AttributeError, OSError) as e:
+            # 跨文件系统 / 内核或平台不支持：逐级降级，已拷贝部分不受影响
+            if method == "buffered" or (
+                isinstance(e, OSError) and e.errno not in (errno.EXDEV, errno.ENOSYS, errno.EINVAL, errno.EOPNOTSUPP)
+            ):
+                raise
+            method = "sendfile" if method == "copy_file_range" else "buffered"
+            continue
+        if n == 0:
+            break
+        copied += n
+
+    if copied != size:
+        raise IOError(f"分片拷贝不完整: copied={copied}, expected={size}")
+    return method
+
+
+def merge_parts(session: UploadSession, file: File, parts, tmp_path: str) -> None:
+    """
+    parts 模式：按顺序把分片文件拼接到 tmp_path，数据由内核直接搬运，不经过 Python 缓冲
+
+    :raises FileNotFoundError: 分片文件缺失
+    :raises IOError: 拷贝不完整或合并后大小与 file.file_size 不符
+    """
+    start = time.monotonic()
+    total_bytes = 0
+    methods = set()
+    with open(tmp_path, "wb", buffering=0) as out_f:
+        for part in parts:
+            chunk_path = get_chunk_path(file.fingerprint, part.part_number)
+            if not os.path.exists(chunk_path):
+                # 分片文件丢失，终止本次合并并回滚状态
+                log_line(
+                    f"[ERROR] [merge_worker] 分片文件缺失: {chunk_path}, "
+                    f"session_id={session.id}, fingerprint={file.fingerprint}"
+                )
+                raise FileNotFoundError(chunk_path)
+
+            with open(chunk_path, "rb", buffering=0) as in_f:
+                size = os.fstat(in_f.fileno()).st_size
+                methods.add(_copy_range(in_f.fileno(), out_f.fileno(), size))
+                total_bytes += size
+
+        if total_bytes != file.file_size:
+            raise IOError(f"合并后大小不符: size={total_bytes}, expected={file.file_size}")
+
+        if CHUNK_FSYNC_POLICY == "merge":
+            os.fsync(out_f.fileno())
+
+    elapsed = time.monotonic() - start
+    log_line(
+        f"[INFO] [merge_worker] 分片拼接完成: session_id={session.id}, chunks={len(parts)}, "
+        f"bytes={total_bytes}, elapsed={elapsed:.3f}s, "
+        f"throughput={total_bytes / 1024 / 1024 / max(elapsed, 1e-6):.1f}MB/s, "
+        f"method={'/'.join(sorted(methods))}"
+    )
+
+
+def set_session_status(session: UploadSession, status: str) -> None:
+    """
+    只更新会话状态；不能整行 save()，否则会用读取时的旧计数覆盖 chunk_complete 并发累加的 uploaded_chunks
+    """
+    UploadSession.update(status=status).where(UploadSession.id == session.id).execute()
+    session.status = status
+
+
 def merge_one_session(session: UploadSession):
     immich_api = IMMICHApi()
     file = session.file
@@ -96,8 +193,7 @@ def merge_one_session(session: UploadSession):
 
     if not parts:
         # 没有任何分片，状态回滚，避免一直卡在 READY_TO_COMPLETE
-        session.status = SESSION_STATUS_UPLOADING
-        session.save()
+        set_session_status(session, SESSION_STATUS_UPLOADING)
         log_line(
             f"[INFO] [merge_worker] 无分片记录，回滚为 UPLOADING: session_id={session.id}"
         )
@@ -105,8 +201,7 @@ def merge_one_session(session: UploadSession):
 
     if len(parts) != session.total_chunks:
         # 分片数量不完整，回滚
-        session.status = SESSION_STATUS_UPLOADING
-        session.save()
+        set_session_status(session, SESSION_STATUS_UPLOADING)
         log_line(
             f"[INFO] [merge_worker] 分片数量不完整，回滚为 UPLOADING: "
             f"session_id={session.id}, got={len(parts)}, expected={session.total_chunks}"
@@ -115,40 +210,41 @@ def merge_one_session(session: UploadSession):
 
     ensure_immich_root()
     final_path = get_final_file_path(file)
+    partial_path = get_partial_path(file)
     tmp_path = final_path + ".tmp"
 
     try:
-        with open(tmp_path, "wb") as out_f:
+        if os.path.exists(partial_path):
+            # preallocate 模式：分片已按偏移写入预分配文件，合并只需 fsync + 原子 rename
+            fd = os.open(partial_path, os.O_RDONLY)
+            try:
+                os.fsync(fd)
+                size = os.fstat(fd).st_size
+            finally:
+                os.close(fd)
+            if size != file.file_size:
+                raise RuntimeError(
+                    f"预分配文件大小不符: {partial_path}, size={size}, expected={file.file_size}"
+                )
+            os.replace(partial_path, final_path)
+        else:
+            merge_parts(session, file, parts, tmp_path)
+            os.replace(tmp_path, final_path)
+
+            # 删除分片
             for part in parts:
                 chunk_path = get_chunk_path(file.fingerprint, part.part_number)
-                if not os.path.exists(chunk_path):
-                    # 分片文件丢失，终止本次合并并回滚状态
-                    log_line(
-                        f"[ERROR] [merge_worker] 分片文件缺失: {chunk_path}, "
-                        f"session_id={session.id}, fingerprint={file.fingerprint}"
-                    )
-                    raise FileNotFoundError(chunk_path)
-
-                with open(chunk_path, "rb") as in_f:
-                    shutil.copyfileobj(in_f, out_f, length=1024 * 1024)
-
-        os.replace(tmp_path, final_path)
-
-        # 删除分片
-        for part in parts:
-            chunk_path = get_chunk_path(file.fingerprint, part.part_number)
-            try:
-                os.remove(chunk_path)
-            except FileNotFoundError:
-                pass
+                try:
+                    os.remove(chunk_path)
+                except FileNotFoundError:
+                    pass
 
         # 更新状态
         file.status = FILE_STATUS_COMPLETED
         file.url = file.cos_key
         file.save()
 
-        session.status = SESSION_STATUS_COMPLETED
-        session.save()
+        set_session_status(session, SESSION_STATUS_COMPLETED)
 
         log_line(
             f"[INFO] [merge_worker] 合并成功: session_id={session.id}, "
@@ -192,8 +288,7 @@ def merge_one_session(session: UploadSession):
         except Exception:
             pass
 
-        session.status = SESSION_STATUS_UPLOADING
-        session.save()
+        set_session_status(session, SESSION_STATUS_UPLOADING)
 
 
 def poll_and_merge_once() -> bool:
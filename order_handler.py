@@ -3,13 +3,12 @@ import logging
 import os
 import random
 import re
-import tempfile
-import uuid
 from typing import Optional, Literal, List
 
+from config import ORDER_PHOTO_MAX_BYTES
 from order_template import *
-from oss_client import get_random_template_url_from_db, download_temp_image
-from tasks.watermark_task import add_watermark_to_image
+from oss_client import get_random_template_url_from_db, download_image_bytes
+from tasks.watermark_task import render_watermark
 from utils.custom_raise import *
 from utils.notification import Notify
 
@@ -85,6 +84,15 @@ ORDER_RULES = {
 }
 
 
+def _read_file_bytes(path: str) -> Optional[bytes]:
+    """读取本地文件字节，文件不存在时返回 None"""
+    try:
+        with open(path, "rb") as f:
+            return f.read()
+    except FileNotFoundError:
+        return None
+
+
 def init_template_pic_dirs(user_number: str, base_dir: str = "TemplatePic") -> None:
     """
     根据 ORDER_RULES 在 base_dir 下为指定用户创建目录结构。
@@ -132,10 +140,6 @@ class OrderHandler:
         self.oss = oss
         # self.notify = Notify()
 
-        # 设置统一临时目录
-        self.tmp_dir = os.path.join(tempfile.gettempdir(), "order_watermarks")
-        os.makedirs(self.tmp_dir, exist_ok=True)
-
     def complete_order_by_keyword(self, order_list, keyword: str, user: str, user_number: str, template_pics: List):
         """
         按关键字自动完成工单（对外接口）
@@ -271,108 +275,73 @@ class OrderHandler:
             + ", ".join(dt.strftime("%Y-%m-%d %H:%M") for dt in watermark_times)
         )
 
-        # 7️⃣ 生成水印图片（唯一文件名），每张使用各自的 base_date/base_time
-        image_paths: List[str] = []
-        downloaded_templates: List[str] = []  # 记录下载到本地的模板路径，用于后续清理
+        # 7️⃣ 生成水印图片（全程在内存中完成），每张使用各自的 base_date/base_time
+        watermarked_images: List[bytes] = []
 
         use_provided_urls = bool(template_pics) and len(template_pics) == image_count
-        try:
-            for i in range(image_count):
-                # 1. 确定分类和子分类逻辑
-                category = rule['template']
-                sub_category = ""
-                sequence = str(i + 1)
-
-                if title == "单元楼栋月巡检":
-                    matches = re.findall(r"[a-zA-Z]\d+", target_order.get("address", ""))
-                    if matches:
-                        sub_category = matches[0]
-
-                # 2. 获取图片 URL
-                cos_url = None
-
-                if use_provided_urls:
-                    # template_pics 直接存的就是 URL 列表
-                    cos_url = template_pics[i]
-                else:
-                    # 从数据库获取随机 URL
-                    cos_url = get_random_template_url_from_db(
-                        user_number, category, sub_category, sequence
-                    )
-
-                # 3. 下载模板到本地临时目录
-                if cos_url:
-                    original_image_path = download_temp_image(f"{cos_url}?imageMogr2/format/jpg", self.tmp_dir)
-                else:
-                    # Fallback 逻辑：如果数据库没有，使用本地的 black.jpg
-                    original_image_path = "black.jpg"
-                    # 注意：如果是 black.jpg，不需要放进待删除列表，除非它是动态生成的
-
-                if not original_image_path or not os.path.exists(original_image_path):
-                    msg = f"无法获取模板图片: {category}/{sub_category}/{sequence}"
-                    logger.error(msg)
-                    raise ImageUploadError(msg)
-
-                # 记录下载的路径，任务结束后删除
-                if original_image_path != "black.jpg":
-                    downloaded_templates.append(original_image_path)
-
-                # 使用为当前索引预先计算好的水印时间
-                wm_dt = watermark_times[i]
-                base_date = wm_dt.strftime("%Y-%m-%d")
-                base_time = wm_dt.strftime("%H:%M")
-
-                # 输出临时文件名
-                tmp_filename = f"wm_{uuid.uuid4().hex}.jpg"
-                tmp_path = os.path.join(self.tmp_dir, tmp_filename)
-
-                # 生成水印图片
-                add_watermark_to_image(
-                    original_image_path=original_image_path,
-                    base_date=base_date,
-                    base_time=base_time,
-                    name=user,
-                    user_number=user_number,
-                    output_path=tmp_path,
+        for i in range(image_count):
+            # 1. 确定分类和子分类逻辑
+            category = rule['template']
+            sub_category = ""
+            sequence = str(i + 1)
+
+            if title == "单元楼栋月巡检":
+                matches = re.findall(r"[a-zA-Z]\d+", target_order.get("address", ""))
+                if matches:
+                    sub_category = matches[0]
+
+            # 2. 获取图片 URL
+            cos_url = None
+
+            if use_provided_urls:
+                # template_pics 直接存的就是 URL 列表
+                cos_url = template_pics[i]
+            else:
+                # 从数据库获取随机 URL
+                cos_url = get_random_template_url_from_db(
+                    user_number, category, sub_category, sequence
                 )
-                image_paths.append(tmp_path)
-        finally:
-            # --- 最终统一清理 ---
-            # 1. 清理下载的模板原图
-            for path in downloaded_templates:
-                try:
-                    if os.path.exists(path):
-                        os.remove(path)
-                except Exception as e:
-                    logger.error(f"清理模板缓存失败: {path}, {e}")
+
+            # 3. 下载模板到内存
+            if cos_url:
+                original_image = download_image_bytes(f"{cos_url}?imageMogr2/format/jpg")
+            else:
+                # Fallback 逻辑：如果数据库没有，使用本地的 black.jpg
+                original_image = _read_file_bytes("black.jpg")
+
+            if not original_image:
+                msg = f"无法获取模板图片: {category}/{sub_category}/{sequence}"
+                logger.error(msg)
+                raise ImageUploadError(msg)
+
+            # 使用为当前索引预先计算好的水印时间
+            wm_dt = watermark_times[i]
+            base_date = wm_dt.strftime("%Y-%m-%d")
+            base_time = wm_dt.strftime("%H:%M")
+
+            # 生成水印图片
+            watermarked_images.append(render_watermark(
+                original_image,
+                base_date=base_date,
+                base_time=base_time,
+                name=user,
+                user_number=user_number,
+                max_bytes=ORDER_PHOTO_MAX_BYTES,
+            ))
 
         # 8️⃣ 上传图片（任意一张失败直接抛错）
         uploaded_urls: List[str] = []
         try:
-            for path in image_paths:
-                url = self.oss.upload(path)
+            for data in watermarked_images:
+                url = self.oss.upload_bytes(data, "jpg")
                 uploaded_urls.append(url)
                 logger.info(f"{log_prefix} 上传成功: {url}")
         except Exception as e:
             msg = f"{log_prefix} 上传失败: {e}"
             logger.error(msg, exc_info=True)
-            # 清理已生成的临时文件再抛异常
-            for p in image_paths:
-                try:
-                    os.remove(p)
-                except Exception:
-                    pass
             raise ImageUploadError(msg) from e
-        finally:
-            # 9️⃣ 清理临时文件（失败不视为致命错误）
-            for path in image_paths:
-                try:
-                    os.remove(path)
-                    logger.debug(f"{log_prefix} 已删除临时文件: {path}")
-                except Exception as e:
-                    logger.warning(f"{log_prefix} 删除临时文件失败: {path}, {e}")
-
-        # 🔟 校验上传数量
+
+        # 9️⃣ 校验上传数量
         if len(uploaded_urls) < image_count:
             msg = (
                 f"{log_prefix} 部分图片上传失败，未提交工单: "
@@ -381,7 +350,7 @@ class OrderHandler:
             logger.warning(msg)
             raise PartialUploadError(msg)
 
-        # 1️⃣1️⃣ 提交工单
+        # 🔟 提交工单
         payload = rule["func"](order_id, *uploaded_urls)
         self.fm.submit_order(payload)
         logger.info(f"{log_prefix} 提交工单: {json.dumps(payload, ensure_ascii=False)}")
@@ -389,7 +358,7 @@ class OrderHandler:
 
         logger.info(f"工单【{title}】{mode_desc}处理完成 ✅")
 
-        # 1️⃣2️⃣ 返回信息（按原来两个方法的差异来拼）
+        # 1️⃣1️⃣ 返回信息（按原来两个方法的差异来拼）
         result = {
             "order_id": order_id,
             "title": title,
@@ -1,6 +1,7 @@
 import datetime
 import hashlib
 import hmac
+import io
 import json
 import logging
 import os
@@ -32,6 +33,18 @@ def download_temp_image(url, tmp_dir):
     return None
 
 
+def download_image_bytes(url):
+    """下载图片到内存，返回字节；失败返回 None"""
+    try:
+        response = requests.get(url, timeout=10)
+        if response.status_code == 200:
+            return response.content
+        logger.error(f"下载模板图片失败: {url}, status={response.status_code}")
+    except Exception as e:
+        logger.error(f"下载模板图片失败: {url}, error: {e}")
+    return None
+
+
 def get_random_template_url_from_db(user_number, category, sub_category="", sequence="1"):
     """从数据库随机获取一个 COS URL"""
     try:
@@ -98,14 +111,44 @@ class OSSClient:
         return self.oss
 
     def upload(self, file_path, retry_count=0):
+        file_ext = file_path.split(".")[-1]
+        return self._put_object(
+            lambda: open(file_path, "rb"),
+            os.path.getsize(file_path),
+            file_ext,
+            file_path,
+            retry_count=retry_count,
+        )
+
+    def upload_bytes(self, data, file_ext="jpg", retry_count=0):
+        """上传内存中的文件内容（例如水印图片字节），不经过本地临时文件"""
+        return self._put_object(
+            lambda: io.BytesIO(data),
+            len(data),
+            file_ext,
+            f"<内存文件 {len(data)} 字节>",
+            retry_count=retry_count,
+        )
+
+    def _put_object(self, open_body, file_size, file_ext, desc, retry_count=0):
+        """
+        签名并 PUT 上传到 COS
+
+        :param open_body: 无参函数，返回可读的文件对象（每次重试重新打开）
+        :param file_size: 内容长度（字节）
+        :param file_ext: 扩展名，用于生成 key 与 Content-Type
+        :param desc: 日志中展示的来源描述
+        :param retry_count: 已重试次数
+        :returns: 上传后的 URL
+        :raises RuntimeError: 重试多次仍失败
+        """
         if retry_count > 3:
-            raise RuntimeError(f"文件上传多次失败: {file_path}")
+            raise RuntimeError(f"文件上传多次失败: {desc}")
 
         if not self.oss:
             self.get_oss_policy()
 
         file_uuid = str(uuid.uuid4())
-        file_ext = file_path.split(".")[-1]
         today = datetime.datetime.today()
         upload_key = f"{self.oss['uploadPath']}{today.year}/{today.month:02d}/{today.day:02d}/{file_uuid}.{file_ext}"
 
@@ -124,9 +167,6 @@ class OSSClient:
         # 计算 SignKey
         sign_key = hmac.new(secret_key.encode('utf-8'), sign_time.encode('utf-8'), hashlib.sha1).hexdigest()
 
-        # 获取文件大小
-        file_size = os.path.getsize(file_path)
-
         # 构造 HttpString (注意：方法名必须小写，header参数必须按字母序排列)
         http_method = "put"
         http_uri = f"/{upload_key}"
@@ -176,12 +216,12 @@ class OSSClient:
 
         upload_url = f"{self.oss['uploadUrl']}/{upload_key}"
 
-        logger.info(f"开始上传文件: {file_path}")
+        logger.info(f"开始上传文件: {desc}")
         logger.debug(f"上传URL: {upload_url}")
         logger.debug(f"Authorization: {authorization}")
 
         try:
-            with open(file_path, "rb") as f:
+            with open_body() as f:
                 r = self.session.put(upload_url, data=f, headers=headers, timeout=30)
 
             if r.status_code in [200, 204]:
@@ -196,7 +236,7 @@ class OSSClient:
                     self.get_oss_policy()
                 
                 # 递归重试时增加计数
-                return self.upload(file_path, retry_count=retry_count + 1)
+                return self._put_object(open_body, file_size, file_ext, desc, retry_count=retry_count + 1)
         except Exception as e:
             logger.error(f"上传异常: {str(e)}")
             raise
@@ -1,12 +1,14 @@
-import hashlib
 import os
-import time
 
-from flask import Blueprint, jsonify, request, make_response, send_file
-from werkzeug.http import http_date
+from flask import Blueprint, jsonify, request
+from PIL import UnidentifiedImageError
 
 from config import GALLERY_STORAGE_DIR, GALLERY_CACHE_DIR, WATERMARK_STORAGE_DIR
+from utils.file_response import send_bytes_cached, send_file_cached
+from utils.image_index import AmbiguousImageId, get_image_index
+from utils.image_variant import get_variant, parse_variant_params, variant_mimetype
 from utils.logger import log_line
+from utils.result_store import get_result_store
 
 bp = Blueprint("image", __name__)
 
@@ -16,7 +18,13 @@ def serve_image(image_type, image_id):
     """
     图片外链（支持 gallery / watermark / gallery_cache / reviews）
     reviews 支持多层目录结构
+    支持 ?w=320&fmt=webp 返回缩放 / 转码后的变体（缓存在 GALLERY_CACHE_DIR）
     """
+    try:
+        width, fmt = parse_variant_params(request.args.get("w"), request.args.get("fmt"))
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+
     try:
         # ------- 1. 处理基础目录 -------
         if image_type == "gallery":
@@ -25,6 +33,13 @@ def serve_image(image_type, image_id):
         elif image_type == "watermark":
             base = WATERMARK_STORAGE_DIR
 
+            # 刚生成的水印图片优先从本 worker 的内存结果缓存返回
+            store = get_result_store()
+            cached = store.get(image_id) if store and not (width or fmt) else None
+            if cached:
+                data, etag, mtime = cached
+                return send_bytes_cached(data, etag, mtime, "image/jpeg", max_age=2592000)
+
         elif image_type == "gallery_cache":
             base = GALLERY_CACHE_DIR
 
@@ -41,22 +56,21 @@ def serve_image(image_type, image_id):
             if not os.path.exists(path):
                 return jsonify({"error": "Review 图片不存在"}), 404
 
-            return _serve_file_with_cache(path)
+            return _serve_file_with_cache(path, width=width, fmt=fmt)
 
         else:
             return jsonify({"error": "无效的图片类型"}), 400
 
-        # ------- 2. 原有 gallery 逻辑（保持不变） -------
-        files = os.listdir(base)
-        match = next((f for f in files if f.startswith(image_id)), None)
-        if not match:
+        # ------- 2. gallery / watermark / gallery_cache：走进程内文件名索引 -------
+        try:
+            found = get_image_index(base).lookup(image_id)
+        except AmbiguousImageId as e:
+            return jsonify({"error": "image_id 不唯一", "candidates": e.candidates}), 409
+        if not found:
             return jsonify({"error": "图片不存在"}), 404
 
-        path = os.path.join(base, match)
-        if not os.path.exists(path):
-            return jsonify({"error": "图片文件不存在"}), 404
-
-        return _serve_file_with_cache(path)
+        path, stat = found
+        return _serve_file_with_cache(path, stat, width, fmt)
 
     except Exception as e:
         log_line(f"[ERROR] 获取图片失败: {e}")
@@ -64,21 +78,13 @@ def serve_image(image_type, image_id):
 
 
 
-def _serve_file_with_cache(path):
-    """统一封装图片返回逻辑，减少重复代码"""
-    stat = os.stat(path)
-    etag = hashlib.md5(f"{stat.st_mtime}-{stat.st_size}".encode()).hexdigest()
-    last_modified = http_date(stat.st_mtime)
-
-    # 缓存检查
-    if request.headers.get("If-None-Match") == etag:
-        return "", 304
-    if request.headers.get("If-Modified-Since") == last_modified:
-        return "", 304
-
-    resp = make_response(send_file(path, mimetype='image/jpeg', as_attachment=False))
-    resp.headers['ETag'] = etag
-    resp.headers['Last-Modified'] = last_modified
-    resp.headers['Cache-Control'] = 'public, max-age=2592000'
-    resp.headers['Expires'] = http_date(time.time() + 2592000)
-    return resp
+def _serve_file_with_cache(path, stat=None, width=None, fmt=None):
+    """统一封装图片返回逻辑，减少重复代码；指定 width / fmt 时返回缓存的变体"""
+    if width or fmt:
+        try:
+            variant = get_variant(path, stat or os.stat(path), width, fmt)
+            return send_file_cached(variant, mimetype=variant_mimetype(fmt or "jpg"), max_age=2592000)
+        except UnidentifiedImageError:
+            # 非图片（如视频）直接返回原文件
+            pass
+    return send_file_cached(path, mimetype="image/jpeg", stat=stat, max_age=2592000)
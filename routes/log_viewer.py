@@ -1,10 +1,11 @@
+import json
 import os
 import time
 from collections import deque
 
-from flask import Blueprint, render_template, Response
+from flask import Blueprint, render_template, Response, jsonify
 
-from config import LOG_PATH
+from config import LOG_PATH, JANITOR_STATS_FILE
 
 bp = Blueprint("log_viewer", __name__)
 
@@ -40,3 +41,12 @@ def stream():
                     time.sleep(0.5)
 
     return Response(generate(), mimetype="text/event-stream")
+
+
+@bp.route("/api/janitor/stats")
+def janitor_stats():
+    """返回存储清理任务最近一轮的统计"""
+    if not os.path.exists(JANITOR_STATS_FILE):
+        return jsonify({"success": False, "error": "暂无清理记录"}), 404
+    with open(JANITOR_STATS_FILE, "r", encoding="utf-8") as f:
+        return jsonify({"success": True, "data": json.load(f)})
@@ -1,7 +1,10 @@
 import json
 import os
 
-from flask import Blueprint, jsonify, send_from_directory
+from flask import Blueprint, jsonify
+from werkzeug.security import safe_join
+
+from utils.file_response import send_file_cached
 
 bp = Blueprint("update", __name__)
 
@@ -97,4 +100,7 @@ def check_update():
 @bp.route("/api/download/<path:filename>")
 def download_file(filename):
     """文件直链接口"""
-    return send_from_directory(APK_DIR, filename, as_attachment=False)
+    path = safe_join(APK_DIR, filename)
+    if path is None or not os.path.isfile(path):
+        return jsonify({"error": "文件不存在"}), 404
+    return send_file_cached(path)
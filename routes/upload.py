@@ -1,6 +1,6 @@
+import io
 import os
 import random
-import shutil
 import tempfile
 from datetime import datetime, timedelta
 from uuid import uuid4
@@ -8,14 +8,22 @@ from uuid import uuid4
 from flask import Blueprint, jsonify, request, render_template
 from werkzeug.utils import secure_filename
 
-from config import WATERMARK_STORAGE_DIR, IMMICH_EXTERNAL_HOST_ROOT, TZ
+from config import (
+    WATERMARK_STORAGE_DIR, IMMICH_EXTERNAL_HOST_ROOT, TZ, REVIEW_BATCH_MAX_ITEMS
+)
 from db import UploadRecord, UploadTask
 from apis.fm_api import FMApi
 from oss_client import OSSClient
-from tasks.watermark_task import watermark_runner
+from tasks.watermark_pool import run_watermark_batch
+from utils.image_index import get_image_index
 from utils.logger import log_line
 from utils.merge import merge_images_grid
-from utils.storage import generate_random_suffix, get_image_url, find_review_dir_by_filename
+from utils.result_store import get_result_store
+from utils.review_index import (
+    record_review, review_dir, move_review, move_reviews, clear_approved, clear_approved_many,
+    list_pending, list_approved_paths
+)
+from utils.storage import generate_random_suffix, get_image_url, write_file_atomic
 
 bp = Blueprint("upload", __name__)
 
@@ -135,19 +143,16 @@ def upload_with_watermark():
 
         base_date_str = base_date or datetime.now(TZ).strftime("%Y-%m-%d")
 
-        temp_paths = []
         task_args_list = []
         result_meta = []
+        merging = merge and len(files) > 1
+        # 子进程各自写好输出文件；启用结果缓存或需要拼图时再把 JPEG 字节传回本进程
+        store = get_result_store()
+        return_bytes = store is not None or merging
 
         for idx, f in enumerate(files):
-            suffix = os.path.splitext(f.filename or "")[1].lower()
-            if not suffix:
-                suffix = ".jpg"
-
-            fd, ori_path = tempfile.mkstemp(suffix=suffix)
-            os.close(fd)
-            f.save(ori_path)
-            temp_paths.append(ori_path)
+            # 直接从上传流读取原图字节，解码 / 渲染全部在内存中完成，只落盘最终输出
+            ori_data = f.stream.read()
 
             ts = datetime.now(TZ).strftime("%Y%m%d_%H%M%S")
             suffix_code = generate_random_suffix()
@@ -162,15 +167,21 @@ def upload_with_watermark():
             time_str = curr.strftime("%H:%M")
 
             task_args_list.append(
-                (ori_path, name, user_number, base_date_str, time_str, out_file)
+                (ori_data, name, user_number, base_date_str, time_str, out_file, return_bytes)
             )
             result_meta.append((image_id, out_file))
 
-        for args in task_args_list:
-            watermark_runner(args)
+        results = run_watermark_batch(task_args_list)
+        watermark_index = get_image_index(WATERMARK_STORAGE_DIR)
+
+        # 子进程返回时输出已落盘：请求可能落到任意 worker，内存缓存只做读加速
+        for (image_id, out_file), result in zip(result_meta, results):
+            if store is not None:
+                store.put(image_id, result, os.stat(out_file))
+            watermark_index.add(os.path.basename(out_file))
 
-        if merge and len(result_meta) > 1:
-            merged = merge_images_grid([p for _, p in result_meta])
+        if merging:
+            merged = merge_images_grid(results)
             ts = datetime.now(TZ).strftime("%Y%m%d_%H%M%S")
             suffix_code = generate_random_suffix()
             merged_id = f"{user_number}_{ts}_{suffix_code}_merged"
@@ -178,8 +189,14 @@ def upload_with_watermark():
                 WATERMARK_STORAGE_DIR,
                 f"{merged_id}.jpg"
             )
-            merged.save(merged_file, quality=85, optimize=False)
+            buf = io.BytesIO()
+            merged.save(buf, "JPEG", quality=85, optimize=False)
             merged.close()
+            merged_data = buf.getvalue()
+            write_file_atomic(merged_file, merged_data)
+            if store is not None:
+                store.put(merged_id, merged_data, os.stat(merged_file))
+            watermark_index.add(f"{merged_id}.jpg")
             oss_urls = [get_image_url(merged_id, "watermark")]
         else:
             oss_urls = [
@@ -187,12 +204,6 @@ def upload_with_watermark():
                 for image_id, _ in result_meta
             ]
 
-        for p in temp_paths:
-            try:
-                os.remove(p)
-            except Exception:
-                pass
-
         log_line(f"[INFO] 生成水印图片 {len(oss_urls)} 张（merge={merge}）")
 
         return jsonify({
@@ -201,6 +212,13 @@ def upload_with_watermark():
             "count": len(oss_urls)
         })
 
+    except TimeoutError as e:
+        log_line(f"[ERROR] 水印生成超时: {e}")
+        return jsonify({
+            "success": False,
+            "error": str(e)
+        }), 504
+
     except Exception as e:
         import traceback
         traceback.print_exc()
@@ -339,7 +357,7 @@ def upload_to_gallery():
 def add_review():
     """
     保存 review 文件到 storage/reviews/pending/ 目录中，目录结构完整复刻 file_path，
-    审核文件名来自上传的 file.filename。
+    审核文件名来自上传的 file.filename，并登记到审核索引表。
 
     示例：
     file.filename = 123.jpg
@@ -361,7 +379,7 @@ def add_review():
     clean_path = file_path.lstrip("/").replace("\\", "/")
     # 目录使用完整的 file_path（含原始文件名）
     # storage/reviews/pending/aaa/bbb/ccc/this_is_a_video.mp4/
-    save_dir = os.path.join("storage", "reviews", "pending", clean_path)
+    save_dir = review_dir("pending", clean_path)
     os.makedirs(save_dir, exist_ok=True)
 
     # 审核文件名使用上传文件自身的文件名（一般是 md5 命名的唯一名）
@@ -369,6 +387,7 @@ def add_review():
     save_path = os.path.join(save_dir, filename)
 
     file.save(save_path)
+    record_review(filename, clean_path)
 
     # 相对路径用于前端访问 /api/image/reviews/<relative>
     relative_path = f"pending/{clean_path}/{filename}".replace("\\", "/")
@@ -382,67 +401,109 @@ def add_review():
     })
 
 
-@bp.route("/api/review/approve", methods=["POST"])
-def review_approve():
-    """
-    审核通过：根据文件名找到所在目录并整体移动到 approve 下
-    """
+def _review_move_response(action: str):
+    """审核通过 / 拒绝：按索引定位文件所在目录并整体移动到 action 目录下"""
     filename = request.json.get("filename")  # 文件名（唯一 MD5 名）
     if not filename:
         raise KeyError("filename 必填")
 
     try:
-        src_dir = find_review_dir_by_filename(filename)
+        src, dst = move_review(filename, action)
     except FileNotFoundError as e:
         return jsonify({"error": str(e)}), 404
 
-    # pending/.../xxx
-    rel_path = os.path.relpath(src_dir, os.path.join("storage", "reviews", "pending"))
-    dst_dir = os.path.join("storage", "reviews", "approve", rel_path)
-
-    os.makedirs(os.path.dirname(dst_dir), exist_ok=True)
-    shutil.move(src_dir, dst_dir)
-
     return jsonify({
         "msg": "ok",
-        "action": "approve",
-        "from": f"pending/{rel_path}",
-        "to": f"approve/{rel_path}"
+        "action": action,
+        "from": src,
+        "to": dst
     })
 
 
+@bp.route("/api/review/approve", methods=["POST"])
+def review_approve():
+    """
+    审核通过：根据文件名找到所在目录并整体移动到 approve 下
+    """
+    return _review_move_response("approve")
+
+
 @bp.route("/api/review/reject", methods=["POST"])
 def review_reject():
     """
     审核拒绝：根据文件名找到所在目录并整体移动到 reject 下
     """
-    filename = request.json.get("filename")
-    if not filename:
-        raise KeyError("filename 必填")
+    return _review_move_response("reject")
 
-    try:
-        src_dir = find_review_dir_by_filename(filename)
-    except FileNotFoundError as e:
-        return jsonify({"error": str(e)}), 404
 
-    rel_path = os.path.relpath(src_dir, os.path.join("storage", "reviews", "pending"))
-    dst_dir = os.path.join("storage", "reviews", "reject", rel_path)
+def _batch_list_arg(key: str):
+    """读取批量接口的列表参数：去重保序、过滤空值，超过上限时返回 None"""
+    values = request.json.get(key) or []
+    if not isinstance(values, list):
+        raise KeyError(f"{key} 必须为列表")
+    values = list(dict.fromkeys(v for v in values if v))
+    if len(values) > REVIEW_BATCH_MAX_ITEMS:
+        return None
+    return values
 
-    os.makedirs(os.path.dirname(dst_dir), exist_ok=True)
-    shutil.move(src_dir, dst_dir)
 
+def _review_batch_move_response(action: str):
+    """批量通过 / 拒绝：逐项返回结果，部分失败不影响其他条目"""
+    filenames = _batch_list_arg("filenames")
+    if filenames is None:
+        return jsonify({"error": f"单次最多处理 {REVIEW_BATCH_MAX_ITEMS} 条"}), 400
+
+    results = move_reviews(filenames, action)
     return jsonify({
         "msg": "ok",
-        "action": "reject",
-        "from": f"pending/{rel_path}",
-        "to": f"reject/{rel_path}"
+        "action": action,
+        "success_count": sum(1 for r in results if r["ok"]),
+        "results": results
     })
 
 
+@bp.route("/api/review/approve/batch", methods=["POST"])
+def review_approve_batch():
+    """
+    批量审核通过：{"filenames": ["a.jpg", "b.jpg", ...]}
+    """
+    return _review_batch_move_response("approve")
+
+
+@bp.route("/api/review/reject/batch", methods=["POST"])
+def review_reject_batch():
+    """
+    批量审核拒绝：{"filenames": ["a.jpg", "b.jpg", ...]}
+    """
+    return _review_batch_move_response("reject")
+
+
+@bp.route("/api/review/clear/batch", methods=["POST"])
+def review_clear_batch():
+    """
+    批量清除审核通过的业务路径：{"file_paths": ["/aaa/video1.mp4", ...]}
+    即使路径不存在也视为成功。
+    """
+    file_paths = _batch_list_arg("file_paths")
+    if file_paths is None:
+        return jsonify({"error": f"单次最多处理 {REVIEW_BATCH_MAX_ITEMS} 条"}), 400
+
+    return jsonify({"msg": "ok", "results": clear_approved_many(file_paths)})
+
+
+def _page_args():
+    """解析可选的分页参数 page / page_size，未传 page 时返回 (None, None) 表示不分页"""
+    page = request.args.get("page", type=int)
+    if page is None:
+        return None, None
+    page_size = request.args.get("page_size", default=100, type=int)
+    return max(page, 1), min(max(page_size, 1), 1000)
+
+
 @bp.route("/api/review/pending-list", methods=["GET"])
 def review_pending_list():
     """
-    列出所有待审核的文件。
+    列出待审核的文件（读审核索引表，支持 ?page=&page_size= 分页）。
 
     目录结构示例：
     storage/reviews/pending/aaa/bbb/ccc/this_is_a_video.mp4/123.jpg
@@ -451,77 +512,41 @@ def review_pending_list():
     - 原始业务 file_path = /aaa/bbb/ccc/this_is_a_video.mp4
     - 审核文件名 = 123.jpg
 
-    :returns: JSON，list 中每一项包含 filename、file_path、dir、relative_path 等字段
+    :returns: JSON，list 中每一项包含 filename、file_path、dir、relative_path 等字段，以及 total
     :raises keyError: 本函数不主动抛出 KeyError，占位以统一文档格式
     """
-    base_dir = os.path.join("storage", "reviews", "pending")
-    results = []
-
-    if not os.path.exists(base_dir):
-        return jsonify({"list": []})
+    page, page_size = _page_args()
+    items, total = list_pending(page, page_size)
 
-    for root, dirs, files in os.walk(base_dir):
-        for filename in files:
-            # 文件绝对路径
-            abs_path = os.path.join(root, filename)
-            # 相对于 pending 根目录的路径，例如：
-            # "aaa/bbb/ccc/this_is_a_video.mp4/123.jpg"
-            rel_path = os.path.relpath(abs_path, base_dir)
-            rel_path_unix = rel_path.replace("\\", "/")
-
-            # 目录部分即为原始 file_path（去掉审核文件名）
-            # "aaa/bbb/ccc/this_is_a_video.mp4"
-            rel_dir_unix = os.path.dirname(rel_path_unix)
-
-            # 原始业务路径（带前导 /）
-            file_path = "/" + rel_dir_unix if rel_dir_unix else "/"
-
-            results.append({
-                "filename": filename,  # 审核文件名，例如 123.jpg（md5命名）
-                "file_path": file_path,  # 原始业务路径，例如 /aaa/bbb/ccc/this_is_a_video.mp4
-                "dir": rel_dir_unix,  # 相对于 pending 的目录
-                "relative_path": f"pending/{rel_path_unix}"  # 用于 /api/image/reviews/relative_path
-            })
+    results = []
+    for item in items:
+        rel_dir_unix = item.file_path.lstrip("/")
+        results.append({
+            "filename": item.filename,  # 审核文件名，例如 123.jpg（md5命名）
+            "file_path": item.file_path,  # 原始业务路径，例如 /aaa/bbb/ccc/this_is_a_video.mp4
+            "dir": rel_dir_unix,  # 相对于 pending 的目录
+            "relative_path": f"pending/{rel_dir_unix}/{item.filename}"  # 用于 /api/image/reviews/relative_path
+        })
 
-    return jsonify({"list": results})
+    return jsonify({"list": results, "total": total, "page": page, "page_size": page_size})
 
 
 @bp.route("/api/review/approve-list", methods=["GET"])
 def review_approve_list():
     """
-    获取所有审核通过的业务路径（file_path）
+    获取审核通过的业务路径（file_path），支持 ?page=&page_size= 分页
 
     approve 结构示例：
     storage/reviews/approve/aaa/bbb/ccc/this_is_a_video.mp4/123.jpg
 
     业务路径 = /aaa/bbb/ccc/this_is_a_video.mp4
 
-    :returns: JSON -> {list: [file_path1, file_path2, ...]}
+    :returns: JSON -> {list: [file_path1, file_path2, ...], total}
     :raises keyError: 本接口不抛出 KeyError，用于格式统一
     """
-    base_dir = os.path.join("storage", "reviews", "approve")
-    results = set()  # 去重
-
-    if not os.path.exists(base_dir):
-        return jsonify({"list": []})
-
-    for root, dirs, files in os.walk(base_dir):
-        for filename in files:
-            # 绝对路径
-            abs_path = os.path.join(root, filename)
-
-            # 相对路径：aaa/bbb/ccc/this_is_a_video.mp4/123.jpg
-            rel_path = os.path.relpath(abs_path, base_dir)
-            rel_path_unix = rel_path.replace("\\", "/")
-
-            # 目录部分即 file_path：aaa/bbb/ccc/this_is_a_video.mp4
-            dir_part = os.path.dirname(rel_path_unix)
-
-            if dir_part:
-                file_path = "/" + dir_part  # 加前导 /
-                results.add(file_path)
-
-    return jsonify({"list": sorted(results)})
+    page, page_size = _page_args()
+    file_paths, total = list_approved_paths(page, page_size)
+    return jsonify({"list": file_paths, "total": total, "page": page, "page_size": page_size})
 
 
 @bp.route("/api/review/clear", methods=["POST"])
@@ -539,20 +564,7 @@ def review_clear():
     if not file_path:
         raise KeyError("file_path 必填，如 /storage/emulated/0/Movies/video.mp4")
 
-    # 清洗路径
-    clean_path = file_path.lstrip("/").replace("\\", "/")
-
-    # 目标目录
-    target_dir = os.path.join("storage", "reviews", "approve", clean_path)
-
-    try:
-        # 即使不存在也要“尝试删除”
-        if os.path.exists(target_dir):
-            shutil.rmtree(target_dir)
-
-    except Exception as e:
-        # 不抛错，只记录，仍返回成功
-        log_line(f"[ERROR] 审核记录删除失败: {target_dir} -> {e}")
+    clear_approved(file_path)
 
     return jsonify({"msg": "ok"})
 
@@ -1,9 +1,10 @@
 import hashlib
 import os
+import threading
 import traceback
 
 from flask import Blueprint, request, jsonify
-from peewee import IntegrityError, DoesNotExist
+from peewee import Case, DoesNotExist
 
 from config import (
     db,
@@ -12,7 +13,12 @@ from config import (
     FILE_STATUS_UPLOADING,
     SESSION_STATUS_UPLOADING,
     SESSION_STATUS_READY_TO_COMPLETE,
+    SESSION_STATUS_COMPLETED,
     IMMICH_EXTERNAL_HOST_ROOT,
+    CHUNK_FSYNC_POLICY,
+    CHUNK_IO_BUFFER_SIZE,
+    CHUNK_STORAGE_MODE,
+    CHUNK_BATCH_MAX_PARTS,
 )
 from db import File, UploadSession, UploadPart
 
@@ -51,27 +57,222 @@ def get_final_filename(fingerprint: str, file_name: str) -> str:
     return f"{fingerprint}_{safe_name}"
 
 
-def save_chunk_file(file_storage, dst_path: str) -> int:
+def get_partial_path(final_filename: str) -> str:
     """
-    保存分片到本地，返回写入字节数。
+    preallocate 模式下的预分配文件路径，规则与 merge_worker.py 一致：
+
+        /immich-external-library/<file.cos_key>.partial
+    """
+    return os.path.join(IMMICH_EXTERNAL_HOST_ROOT, final_filename + ".partial")
+
+
+def preallocate_partial_file(path: str, file_size: int) -> None:
+    """
+    预分配最终文件：优先 posix_fallocate 真正占用磁盘块，不支持时退化为稀疏文件。
+    已存在时不做任何修改（断点续传）。
     """
     ensure_immich_root()
-    tmp_path = dst_path + ".tmp"
-    file_storage.save(tmp_path)
-    size = os.path.getsize(tmp_path)
-    os.replace(tmp_path, dst_path)
-    return size
+    try:
+        fd = os.open(path, os.O_RDWR | os.O_CREAT | os.O_EXCL, 0o644)
+    except FileExistsError:
+        # 并发 prepare 已经创建
+        return
+    try:
+        try:
+            os.posix_fallocate(fd, 0, file_size)
+        except (AttributeError, OSError):
+            os.ftruncate(fd, file_size)
+    finally:
+        os.close(fd)
+
+
+_io_buffers = threading.local()
+
 
+def _get_io_buffer() -> bytearray:
+    """每个请求线程复用一块读缓冲，避免每个分片重复分配"""
+    buf = getattr(_io_buffers, "buf", None)
+    if buf is None:
+        buf = _io_buffers.buf = bytearray(CHUNK_IO_BUFFER_SIZE)
+    return buf
 
-def calc_md5(path: str) -> str:
+
+def _readinto(stream, buf: bytearray) -> int:
+    readinto = getattr(stream, "readinto", None)
+    if readinto is not None:
+        return readinto(buf) or 0
+    data = stream.read(len(buf))
+    buf[:len(data)] = data
+    return len(data)
+
+
+def _stream_chunk(stream, write) -> tuple:
     """
-    计算分片文件 MD5，用于记录到 UploadPart.etag。
+    从上传流读入复用缓冲区，逐段交给 write 落盘并同时计算 MD5
+
+    :param stream: 上传流
+    :param write: 回调 write(memoryview, 已写字节数)
+    :returns: (写入字节数, MD5)
     """
     md5 = hashlib.md5()
-    with open(path, "rb") as f:
-        for chunk in iter(lambda: f.read(1024 * 1024), b""):
-            md5.update(chunk)
-    return md5.hexdigest()
+    buf = _get_io_buffer()
+    view = memoryview(buf)
+    size = 0
+    while True:
+        n = _readinto(stream, buf)
+        if not n:
+            break
+        md5.update(view[:n])
+        write(view[:n], size)
+        size += n
+    return size, md5.hexdigest()
+
+
+def _check_size(written: int, incoming: int, expected: int) -> None:
+    if written + incoming > expected:
+        raise ValueError(f"分片大小超过应有的 {expected} 字节")
+
+
+def write_chunk_at_offset(file_storage, partial_path: str, offset: int, expected_size: int):
+    """
+    preallocate 模式：把分片用 os.pwrite 直接写到预分配文件的 offset 处，同样单次流式 + 内联 MD5
+
+    :param file_storage: werkzeug FileStorage
+    :param partial_path: 预分配文件路径
+    :param offset: 写入偏移 (part_number - 1) * chunk_size
+    :param expected_size: 分片应有的字节数，多一个字节都不会写入
+    :returns: (写入字节数, 分片 MD5)
+    :raises ValueError: 分片大小与 expected_size 不一致（短分片会在预分配文件中留下空洞，不能登记）
+    """
+    fd = os.open(partial_path, os.O_WRONLY)
+    try:
+        def write(chunk, written):
+            _check_size(written, len(chunk), expected_size)
+            pos = 0
+            while pos < len(chunk):
+                pos += os.pwrite(fd, chunk[pos:], offset + written + pos)
+
+        size, etag = _stream_chunk(file_storage.stream, write)
+        if size != expected_size:
+            raise ValueError(f"分片大小 {size} 字节，应为 {expected_size} 字节")
+        if CHUNK_FSYNC_POLICY == "chunk":
+            os.fdatasync(fd)
+        return size, etag
+    finally:
+        os.close(fd)
+
+
+def save_chunk_file(file_storage, dst_path: str, expected_size: int):
+    """
+    单次流式保存分片：从上传流读入复用缓冲区，边写文件边计算 MD5，写完不再回读。
+
+    :param file_storage: werkzeug FileStorage
+    :param dst_path: 分片最终路径
+    :param expected_size: 分片应有的字节数
+    :returns: (写入字节数, 分片 MD5)
+    :raises ValueError: 分片大小与 expected_size 不一致
+    """
+    ensure_immich_root()
+    tmp_path = dst_path + ".tmp"
+
+    try:
+        with open(tmp_path, "wb", buffering=0) as out:
+            def write(chunk, written):
+                _check_size(written, len(chunk), expected_size)
+                out.write(chunk)
+
+            size, etag = _stream_chunk(file_storage.stream, write)
+            if size != expected_size:
+                raise ValueError(f"分片大小 {size} 字节，应为 {expected_size} 字节")
+            if CHUNK_FSYNC_POLICY == "chunk":
+                os.fsync(out.fileno())
+        os.replace(tmp_path, dst_path)
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+    return size, etag
+
+
+def write_part(file: File, session: UploadSession, part_number: int, file_storage) -> str:
+    """
+    写入一个分片：存在预分配文件时按偏移写入，否则保存为独立分片文件
+
+    分片必须恰好为 min(chunk_size, file_size - offset) 字节。
+
+    :returns: 分片 MD5（etag）
+    :raises ValueError: 分片大小不正确
+    """
+    offset = (part_number - 1) * session.chunk_size
+    expected_size = min(session.chunk_size, file.file_size - offset)
+    if expected_size <= 0:
+        raise ValueError(f"part_number={part_number} 超出文件大小")
+
+    partial_path = get_partial_path(file.cos_key)
+    if os.path.exists(partial_path):
+        _, etag = write_chunk_at_offset(file_storage, partial_path, offset, expected_size)
+    else:
+        chunk_path = get_chunk_path(file.fingerprint, part_number)
+        _, etag = save_chunk_file(file_storage, chunk_path, expected_size)
+    return etag
+
+
+def record_uploaded_parts(file: File, session: UploadSession, parts) -> UploadSession:
+    """
+    登记已落盘的分片并原子累加会话计数，每个请求的 DB 开销与分片总数无关
+
+    INSERT IGNORE 保证同一分片重复上传只记一次；仅在确实新增了行时才执行
+    uploaded_chunks = uploaded_chunks + n。状态切换在同一事务内（行锁仍持有）
+    按计数重新计算，且每次都执行：合并失败回滚为 UPLOADING 后，重传的分片不会新增行，
+    也要能重新进入 READY_TO_COMPLETE。已完成的会话不受影响。
+
+    :param file: File 记录
+    :param session: UploadSession 记录
+    :param parts: [(part_number, etag), ...]
+    :returns: 重新读取的 UploadSession
+    """
+    with db.atomic():
+        inserted = (
+            UploadPart
+            .insert_many([
+                {
+                    UploadPart.file: file,
+                    UploadPart.part_number: part_number,
+                    UploadPart.etag: etag,
+                    UploadPart.status: "DONE",
+                }
+                for part_number, etag in parts
+            ])
+            .on_conflict_ignore()
+            .as_rowcount()
+            .execute()
+        )
+
+        if inserted:
+            (
+                UploadSession
+                .update(uploaded_chunks=UploadSession.uploaded_chunks + inserted)
+                .where(UploadSession.id == session.id)
+                .execute()
+            )
+
+        # MySQL 的 UPDATE SET 按书写顺序使用已更新的列值，其它方言使用旧值；
+        # 状态切换单独一条语句，保证各方言下都基于累加后的计数
+        (
+            UploadSession
+            .update(status=Case(
+                None,
+                [(UploadSession.uploaded_chunks >= UploadSession.total_chunks,
+                  SESSION_STATUS_READY_TO_COMPLETE)],
+                SESSION_STATUS_UPLOADING,
+            ))
+            .where(
+                (UploadSession.id == session.id) &
+                (UploadSession.status != SESSION_STATUS_COMPLETED)
+            )
+            .execute()
+        )
+
+        return UploadSession.get_by_id(session.id)
 
 
 # =========================
@@ -146,6 +347,13 @@ def upload_prepare():
             "data": {}
         }), 400
 
+    if file_size <= 0 or chunk_size <= 0 or total_chunks != -(-file_size // chunk_size):
+        return jsonify({
+            "success": False,
+            "error": "total_chunks 必须等于 ceil(file_size / chunk_size)",
+            "data": {}
+        }), 400
+
     try:
         with db.atomic():
             # 用 fingerprint 做去重
@@ -185,11 +393,23 @@ def upload_prepare():
                 },
             )
 
-            # 如果前端配置变化，以最新请求为准
+            partial_path = get_partial_path(file.cos_key)
+
+            # 如果前端配置变化，以最新请求为准；
+            # 但预分配文件已存在时分片偏移已按旧 chunk_size 写入，不允许再改
             if session.chunk_size != chunk_size or session.total_chunks != total_chunks:
+                if os.path.exists(partial_path):
+                    return jsonify({
+                        "success": False,
+                        "error": "该文件已按原 chunk_size 预分配，不能修改分片配置",
+                        "data": {
+                            "chunk_size": session.chunk_size,
+                            "total_chunks": session.total_chunks,
+                        }
+                    }), 409
                 session.chunk_size = chunk_size
                 session.total_chunks = total_chunks
-                session.save()
+                session.save(only=[UploadSession.chunk_size, UploadSession.total_chunks])
 
             # 查询已上传分片
             uploaded_parts = (
@@ -203,6 +423,11 @@ def upload_prepare():
             )
             uploaded_numbers = [p.part_number for p in uploaded_parts]
 
+            # preallocate 模式：新会话预分配最终文件；已按 parts 模式上传过分片的会话保持原方式
+            if CHUNK_STORAGE_MODE == "preallocate" and not uploaded_numbers:
+                if not os.path.exists(partial_path):
+                    preallocate_partial_file(partial_path, file.file_size)
+
             if created:
                 status = "NEW"
             else:
@@ -290,11 +515,21 @@ def chunk_complete():
             "data": {}
         }), 404
 
-    # 写入本地分片文件
+    if not 1 <= part_number <= session.total_chunks:
+        return jsonify({
+            "success": False,
+            "error": f"part_number 超出范围 1~{session.total_chunks}",
+            "data": {}
+        }), 400
+
     try:
-        chunk_path = get_chunk_path(fingerprint, part_number)
-        save_chunk_file(file_storage, chunk_path)
-        etag = calc_md5(chunk_path)
+        etag = write_part(file, session, part_number, file_storage)
+    except ValueError as e:
+        return jsonify({
+            "success": False,
+            "error": str(e),
+            "data": {}
+        }), 400
     except Exception as e:
         traceback.print_exc()
         return jsonify({
@@ -304,40 +539,136 @@ def chunk_complete():
         }), 500
 
     try:
-        with db.atomic():
-            # 幂等：同一分片多次上传，保留第一条记录即可
-            try:
-                UploadPart.create(
-                    file=file,
-                    part_number=part_number,
-                    etag=etag,
-                    status="DONE",
-                )
-            except IntegrityError:
-                # 已经存在记录，视为成功
-                pass
+        session = record_uploaded_parts(file, session, [(part_number, etag)])
 
-            done_count = (
-                UploadPart.select()
-                .where(
-                    (UploadPart.file == file) &
-                    (UploadPart.status == "DONE")
-                )
-                .count()
-            )
+        return jsonify({
+            "success": True,
+            "error": "",
+            "data": {
+                "fingerprint": fingerprint,
+                "uploaded_chunks": session.uploaded_chunks,
+                "total_chunks": session.total_chunks,
+                "ready_to_merge": session.status == SESSION_STATUS_READY_TO_COMPLETE,
+            }
+        })
+    except Exception as e:
+        traceback.print_exc()
+        return jsonify({
+            "success": False,
+            "error": f"服务器异常: {e}",
+            "data": {}
+        }), 500
 
-            session.uploaded_chunks = done_count
-            if done_count == session.total_chunks:
-                session.status = SESSION_STATUS_READY_TO_COMPLETE
-            else:
-                session.status = SESSION_STATUS_UPLOADING
-            session.save()
+
+@bp.route("/api/upload/chunk/batch", methods=["POST"])
+def chunk_batch():
+    """
+    一次请求上传多个分片（适合 chunk_size 较小的客户端）：
+    Content-Type: multipart/form-data
+
+    表单字段：
+      - fingerprint: 字符串
+      - part_<n>: 第 n 个分片的二进制数据（n 从 1 开始），可携带多个
+
+    分片按请求体顺序依次落盘，全部写入成功后用一次 insert_many 登记 UploadPart，
+    并只更新一次 UploadSession；任一分片写入失败则整批不登记，客户端重试即可。
+
+    返回 data 结构：
+    {
+      "fingerprint": "...",
+      "parts": [1, 2, 3],
+      "uploaded_chunks": 10,
+      "total_chunks": 24,
+      "ready_to_merge": true/false
+    }
+    """
+    fingerprint = request.form.get("fingerprint")
+    if not fingerprint:
+        return jsonify({
+            "success": False,
+            "error": "缺少 fingerprint",
+            "data": {}
+        }), 400
+
+    items = []
+    for key, file_storage in request.files.items(multi=True):
+        if not key.startswith("part_"):
+            continue
+        try:
+            items.append((int(key[len("part_"):]), file_storage))
+        except ValueError:
+            return jsonify({
+                "success": False,
+                "error": f"非法分片字段: {key}",
+                "data": {}
+            }), 400
+
+    if not items:
+        return jsonify({
+            "success": False,
+            "error": "缺少分片（part_<n>）",
+            "data": {}
+        }), 400
+    if len(items) > CHUNK_BATCH_MAX_PARTS:
+        return jsonify({
+            "success": False,
+            "error": f"单次最多 {CHUNK_BATCH_MAX_PARTS} 个分片",
+            "data": {}
+        }), 400
+
+    part_numbers = [n for n, _ in items]
+    if len(set(part_numbers)) != len(part_numbers):
+        return jsonify({
+            "success": False,
+            "error": "part_number 重复",
+            "data": {}
+        }), 400
+
+    try:
+        file = File.get(File.fingerprint == fingerprint)
+        session = UploadSession.get(UploadSession.file == file)
+    except DoesNotExist:
+        return jsonify({
+            "success": False,
+            "error": "上传会话不存在，请先调用 /api/upload/prepare",
+            "data": {}
+        }), 404
+
+    bad = [n for n in part_numbers if not 1 <= n <= session.total_chunks]
+    if bad:
+        return jsonify({
+            "success": False,
+            "error": f"part_number 超出范围 1~{session.total_chunks}: {bad}",
+            "data": {}
+        }), 400
+
+    parts = []
+    try:
+        for part_number, file_storage in items:
+            parts.append((part_number, write_part(file, session, part_number, file_storage)))
+    except ValueError as e:
+        return jsonify({
+            "success": False,
+            "error": f"part_{part_number}: {e}",
+            "data": {}
+        }), 400
+    except Exception as e:
+        traceback.print_exc()
+        return jsonify({
+            "success": False,
+            "error": f"写入分片失败 part_{part_number}: {e}",
+            "data": {}
+        }), 500
+
+    try:
+        session = record_uploaded_parts(file, session, parts)
 
         return jsonify({
             "success": True,
             "error": "",
             "data": {
                 "fingerprint": fingerprint,
+                "parts": sorted(part_numbers),
                 "uploaded_chunks": session.uploaded_chunks,
                 "total_chunks": session.total_chunks,
                 "ready_to_merge": session.status == SESSION_STATUS_READY_TO_COMPLETE,
@@ -423,32 +754,26 @@ def upload_complete():
             }
         })
 
-    # 检查分片是否齐全
-    parts = (
-        UploadPart.select()
-        .where(
-            (UploadPart.file == file) &
-            (UploadPart.status == "DONE")
-        )
-        .order_by(UploadPart.part_number)
-    )
-    parts_list = list(parts)
-
-    if len(parts_list) != session.total_chunks:
+    # 检查分片是否齐全（uploaded_chunks 由 chunk_complete 原子累加）
+    if session.uploaded_chunks < session.total_chunks:
         return jsonify({
             "success": False,
             "error": "分片数量不完整，无法进入合并队列",
             "data": {
-                "uploaded_chunks": len(parts_list),
+                "uploaded_chunks": session.uploaded_chunks,
                 "total_chunks": session.total_chunks,
             }
         }), 400
 
     try:
         with db.atomic():
-            session.status = SESSION_STATUS_READY_TO_COMPLETE
-            session.uploaded_chunks = len(parts_list)
-            session.save()
+            # 只更新 status，避免用旧的计数覆盖并发累加的结果
+            (
+                UploadSession
+                .update(status=SESSION_STATUS_READY_TO_COMPLETE)
+                .where(UploadSession.id == session.id)
+                .execute()
+            )
 
             # file.status 至少标记为 UPLOADING，合并成功后由 worker 改为 COMPLETED
             if file.status == FILE_STATUS_INIT:
@@ -3,7 +3,7 @@
 # start_server.sh
 # 仅负责“启动当前版本的服务”，不做 git pull：
 # 1. 执行 db.py 初始化数据库
-# 2. 重启各 worker（upload/merge/checkin/refresh_token 等）
+# 2. 重启各 worker（upload/merge/checkin/refresh_token/janitor 等）
 # 3. 启动 Gunicorn（后台运行 + 健康检查）
 # 4. 回显各服务 PID，供 CI/监控解析
 
@@ -118,6 +118,7 @@ WORKERS=(
   "REFRESH_TOKEN_SERVER|$REPO_PATH/refresh_token_server.py|$REPO_PATH/refresh_token_server.log"
   "FM_COMPLETE_WORKER|$REPO_PATH/fm_complete_worker.py|$REPO_PATH/fm_complete_worker.log"
   "NIGHT_ANSWER_SERVER|$REPO_PATH/night_answer_server.py|$REPO_PATH/night_answer_server.log"
+  "JANITOR_WORKER|$REPO_PATH/janitor_worker.py|$REPO_PATH/janitor_worker.log"
 )
 
 for item in "${WORKERS[@]}"; do
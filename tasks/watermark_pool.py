@@ -0,0 +1,113 @@
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor, wait
+from concurrent.futures.process import BrokenProcessPool
+from typing import List, Optional, Sequence, Tuple, Union
+
+from config import WATERMARK_POOL_SIZE, WATERMARK_POOL_TIMEOUT
+from tasks.watermark_task import watermark_runner, warm_up_watermark_assets
+from utils.logger import log_line
+
+_pool: Optional[ProcessPoolExecutor] = None
+_pool_pid: Optional[int] = None
+_lock = threading.Lock()
+
+
+def _init_pool_process():
+    """子进程初始化：预加载字体、turbojpeg 与固定水印图层"""
+    warm_up_watermark_assets()
+
+
+def _ping() -> int:
+    return os.getpid()
+
+
+def get_watermark_pool() -> Optional[ProcessPoolExecutor]:
+    """
+    获取当前进程（gunicorn worker）的常驻水印进程池，不存在时创建
+
+    进程池按 pid 绑定：master 中创建的池在 fork 后不可用，worker 内会重新创建。
+
+    :returns: ProcessPoolExecutor；WATERMARK_POOL_SIZE <= 1 时返回 None（串行模式）
+    """
+    global _pool, _pool_pid
+
+    if WATERMARK_POOL_SIZE <= 1:
+        return None
+
+    with _lock:
+        if _pool is None or _pool_pid != os.getpid():
+            # spawn：gunicorn worker 是多线程进程，fork 出的子进程可能继承到被占用的锁
+            _pool = ProcessPoolExecutor(
+                max_workers=WATERMARK_POOL_SIZE,
+                mp_context=multiprocessing.get_context("spawn"),
+                initializer=_init_pool_process,
+            )
+            _pool_pid = os.getpid()
+        return _pool
+
+
+def warm_up_watermark_pool() -> None:
+    """
+    预热进程池：提前拉起全部子进程并完成资源预加载，供 gunicorn post_worker_init 调用
+    """
+    pool = get_watermark_pool()
+    if pool is None:
+        warm_up_watermark_assets()
+        return
+
+    try:
+        futures = [pool.submit(_ping) for _ in range(WATERMARK_POOL_SIZE)]
+        wait(futures, timeout=WATERMARK_POOL_TIMEOUT)
+        log_line(f"[INFO] 水印进程池已预热: pid={os.getpid()}, size={WATERMARK_POOL_SIZE}")
+    except Exception as e:
+        log_line(f"[ERROR] 水印进程池预热失败: {e}")
+
+
+def shutdown_watermark_pool() -> None:
+    """关闭当前进程持有的水印进程池（gunicorn worker 退出时调用）"""
+    global _pool, _pool_pid
+
+    with _lock:
+        if _pool is not None and _pool_pid == os.getpid():
+            _pool.shutdown(wait=False, cancel_futures=True)
+        _pool = None
+        _pool_pid = None
+
+
+def run_watermark_batch(task_args_list: Sequence[Tuple],
+                        timeout: Optional[float] = None) -> List[Union[str, bytes]]:
+    """
+    把一批水印任务分发到常驻进程池并等待全部完成
+
+    :param task_args_list: watermark_runner 的参数元组列表
+    :param timeout: 整批最长等待秒数，None 时使用 WATERMARK_POOL_TIMEOUT
+    :returns: 与入参顺序一致的输出路径列表（out_file 为 None 的任务返回 JPEG 字节）
+    :raises TimeoutError: 整批未在 timeout 内完成
+    :raises BrokenProcessPool: 子进程异常退出（进程池会在下次调用时重建）
+    """
+    if timeout is None:
+        timeout = WATERMARK_POOL_TIMEOUT
+
+    pool = get_watermark_pool()
+    if pool is None or len(task_args_list) <= 1:
+        return [watermark_runner(args) for args in task_args_list]
+
+    try:
+        futures = [pool.submit(watermark_runner, args) for args in task_args_list]
+    except BrokenProcessPool:
+        shutdown_watermark_pool()
+        raise
+
+    done, not_done = wait(futures, timeout=timeout)
+    if not_done:
+        for f in not_done:
+            f.cancel()
+        raise TimeoutError(f"水印生成超时（{len(not_done)}/{len(futures)} 张未在 {timeout:.0f} 秒内完成）")
+
+    try:
+        return [f.result() for f in futures]
+    except BrokenProcessPool:
+        shutdown_watermark_pool()
+        raise
@@ -1,16 +1,22 @@
+import io
 import json
+import threading
+from collections import OrderedDict
 from datetime import datetime, timedelta
-from typing import Tuple
+from functools import lru_cache
+from typing import Optional, Tuple, Union
 
+import numpy as np
 import qrcode
 from PIL import Image, ImageDraw
 from PIL import ImageFont
 
-from config import TZ
+from config import TZ, WATERMARK_JPEG_QUALITY, WATERMARK_MIN_JPEG_QUALITY
 from utils.crypter import create_watermark_data, encrypt_watermark
+from utils.storage import write_file_atomic
 
 try:
-    from turbojpeg import TurboJPEG, TJPF_RGB
+    from turbojpeg import TurboJPEG, TJPF_RGB, TJSAMP_420
 
     _JPEG = TurboJPEG()
 except Exception:
@@ -36,8 +42,17 @@ def calculate_time(base_date, base_time, minute_offset=0):
     }
 
 
-def generate_qrcode(data, size=300):
-    """生成二维码"""
+def generate_qrcode_matrix(data, size=300) -> np.ndarray:
+    """
+    生成二维码并直接栅格化为 size x size 的 uint8 灰度块（黑 0 / 白 255）
+
+    模块矩阵按最近邻展开到目标尺寸，结果与旧版「box_size=10 渲染后 resize」逐像素一致，
+    但不再经过中间 PIL 图片的渲染与重采样。
+
+    :param data: 二维码内容
+    :param size: 输出边长（像素）
+    :returns: shape 为 (size, size) 的 uint8 数组
+    """
     qr = qrcode.QRCode(
         version=1,
         error_correction=qrcode.constants.ERROR_CORRECT_L,
@@ -47,117 +62,264 @@ def generate_qrcode(data, size=300):
     qr.add_data(data)
     qr.make(fit=True)
 
-    qr_img = qr.make_image(fill_color="black", back_color="white")
-    qr_img = qr_img.resize((size, size))
+    # get_matrix 已包含 border
+    modules = np.asarray(qr.get_matrix(), dtype=bool)
+    n = modules.shape[0]
 
-    return qr_img
+    # 第 i 个输出像素取第 floor((i + 0.5) * n / size) 个模块（等价于 NEAREST 采样）
+    idx = ((2 * np.arange(size) + 1) * n) // (2 * size)
+    return np.where(modules[np.ix_(idx, idx)], 0, 255).astype(np.uint8)
 
 
-def draw_rounded_rectangle(draw, x, y, width, height, radius, fill, alpha=128):
-    """绘制半透明圆角矩形"""
-    # 创建临时图层来绘制半透明效果
-    temp_image = Image.new('RGBA', (width, height), (0, 0, 0, 0))
-    temp_draw = ImageDraw.Draw(temp_image)
+def generate_qrcode(data, size=300):
+    """生成二维码"""
+    return Image.fromarray(generate_qrcode_matrix(data, size), mode="L")
+
+
+def blit_qrcode(canvas: np.ndarray, qr_block: np.ndarray, x: int, y: int) -> None:
+    """
+    把二维码灰度块直接写入 RGB 画布（原地修改，二维码不透明，整块覆盖）
+
+    :param canvas: HxWx3 的 uint8 画布
+    :param qr_block: generate_qrcode_matrix 的输出
+    :param x: 左上角 x
+    :param y: 左上角 y
+    """
+    size = qr_block.shape[0]
+    canvas[y:y + size, x:x + size] = qr_block[:, :, None]
+
+
+def _rounded_rectangle_layer(width, height, radius, fill, alpha=128) -> Image.Image:
+    """生成半透明圆角矩形图层（RGBA）"""
+    layer = Image.new('RGBA', (width, height), (0, 0, 0, 0))
+    layer_draw = ImageDraw.Draw(layer)
 
     # 绘制圆角矩形的主要矩形部分
-    temp_draw.rectangle([radius, 0, width - radius, height], fill=(*fill, alpha))
-    temp_draw.rectangle([0, radius, width, height - radius], fill=(*fill, alpha))
+    layer_draw.rectangle([radius, 0, width - radius, height], fill=(*fill, alpha))
+    layer_draw.rectangle([0, radius, width, height - radius], fill=(*fill, alpha))
 
     # 绘制四个角
-    temp_draw.ellipse([0, 0, radius * 2, radius * 2], fill=(*fill, alpha))
-    temp_draw.ellipse([width - radius * 2, 0, width, radius * 2], fill=(*fill, alpha))
-    temp_draw.ellipse([0, height - radius * 2, radius * 2, height], fill=(*fill, alpha))
-    temp_draw.ellipse([width - radius * 2, height - radius * 2, width, height], fill=(*fill, alpha))
+    layer_draw.ellipse([0, 0, radius * 2, radius * 2], fill=(*fill, alpha))
+    layer_draw.ellipse([width - radius * 2, 0, width, radius * 2], fill=(*fill, alpha))
+    layer_draw.ellipse([0, height - radius * 2, radius * 2, height], fill=(*fill, alpha))
+    layer_draw.ellipse([width - radius * 2, height - radius * 2, width, height], fill=(*fill, alpha))
+    return layer
+
+
+def draw_rounded_rectangle(draw, x, y, width, height, radius, fill, alpha=128):
+    """绘制半透明圆角矩形"""
+    # 创建临时图层来绘制半透明效果
+    temp_image = _rounded_rectangle_layer(width, height, radius, fill, alpha)
 
     # 将临时图层合并到原图
     main_image = draw._image
     main_image.paste(temp_image, (int(x), int(y)), temp_image)
 
 
-def draw_text_watermark(draw, image, time_info, name, scale):
-    """绘制文字水印信息"""
-    canvas_width, canvas_height = image.size
+# ==================== 水印布局（1080x1920 画布，写死） ====================
+WATERMARK_FONT_PATH = "static/siyuansongti.ttf"
+LOCATION_ICON_PATH = "static/location_icon.png"
+LOCATION_TEXT = 'Q南宁中国锦园'
+
+TIME_FONT_SIZE = 75  # 时间字体大小
+NAME_FONT_SIZE = 34  # 姓名字体大小
+DATE_FONT_SIZE = 32  # 日期字体大小
+LOCATION_FONT_SIZE = 32  # 位置字体大小
+
+BORDER_RADIUS = 15
+BG_ALPHA = 102
+
+# 第一行背景（时间 / 姓名 / 日期）
+FIRST_LINE_X = 27  # 左边距
+FIRST_LINE_Y = 1674  # 距离底部 225px
+FIRST_LINE_WIDTH = 480
+FIRST_LINE_HEIGHT = 107
+
+# 第二行背景（位置）
+LOCATION_X = 27
+LOCATION_Y = 1794  # 距离底部 108px
+LOCATION_WIDTH = 302
+LOCATION_HEIGHT = 60
 
-    # 固定字号
-    time_font_size = 75  # 时间字体大小
-    name_font_size = 34  # 姓名字体大小
-    date_font_size = 32  # 日期字体大小
-    location_font_size = 32  # 位置字体大小
 
-    # 加载字体
-    font_path = "static/siyuansongti.ttf"  # 替换为你的字体文件路径
+@lru_cache(maxsize=None)
+def _get_font(size: int):
+    """
+    按字号加载并缓存水印字体（每个进程只读一次字体文件）
+
+    :param size: 字号
+    :returns: FreeTypeFont；字体文件不可用时返回默认字体
+    """
     try:
-        time_font = ImageFont.truetype(font_path, time_font_size)
-        name_font = ImageFont.truetype(font_path, name_font_size)
-        date_font = ImageFont.truetype(font_path, date_font_size)
-        location_font = ImageFont.truetype(font_path, location_font_size)
-    except:
-        # 使用默认字体
-        time_font = ImageFont.load_default()
-        name_font = ImageFont.load_default()
-        date_font = ImageFont.load_default()
-        location_font = ImageFont.load_default()
+        return ImageFont.truetype(WATERMARK_FONT_PATH, size)
+    except Exception:
         print("警告：字体加载失败，使用默认字体")
+        return ImageFont.load_default()
 
-    # 第一行背景位置和尺寸（写死）
-    first_line_x = 27  # 左边距
-    first_line_y = 1674  # 距离底部 225px
-    first_line_width = 480
-    first_line_height = 107
-    borderRadius = 15
 
-    # 绘制第一行背景（半透明黑色）
-    draw_rounded_rectangle(draw, first_line_x, first_line_y, first_line_width, first_line_height, borderRadius,
-                           (0, 0, 0), alpha=102)
+@lru_cache(maxsize=1)
+def _get_static_overlay() -> Tuple[Image.Image, Tuple[int, int]]:
+    """
+    构建并缓存水印中固定不变的图层：两块半透明背景、位置图标、位置文字。
 
-    # 时间文字位置（写死）
-    time_text = time_info['time']
-    time_x = first_line_x + 15
-    time_y = first_line_y - 4
+    图层只在每个进程第一次使用时生成一次，之后每张水印只需贴一次该图层，
+    再绘制时间 / 姓名 / 日期等动态内容。
 
-    draw.text((time_x, time_y), time_text, fill='white', font=time_font)
+    :returns: (裁剪到有效区域的 RGBA 图层, 图层在画布上的左上角坐标)
+    :raises OSError: 位置图标文件不存在或无法读取时抛出
+    """
+    overlay = Image.new('RGBA', (1080, 1920), (0, 0, 0, 0))
 
-    # 姓名和日期位置（写死）
-    name_date_x = first_line_x + 220
+    # 背景（半透明黑色）
+    overlay.alpha_composite(
+        _rounded_rectangle_layer(FIRST_LINE_WIDTH, FIRST_LINE_HEIGHT, BORDER_RADIUS, (0, 0, 0), alpha=BG_ALPHA),
+        (FIRST_LINE_X, FIRST_LINE_Y)
+    )
+    overlay.alpha_composite(
+        _rounded_rectangle_layer(LOCATION_WIDTH, LOCATION_HEIGHT, BORDER_RADIUS, (0, 0, 0), alpha=BG_ALPHA),
+        (LOCATION_X, LOCATION_Y)
+    )
 
-    name_text = name
-    date_text = f"{time_info['date']} {time_info['week']}"
+    # 位置文字：先画在透明白色图层上，再按 alpha 叠加，保证与直接画在原图上的效果一致
+    text_layer = Image.new('RGBA', overlay.size, (255, 255, 255, 0))
+    ImageDraw.Draw(text_layer).text(
+        (LOCATION_X + 65, LOCATION_Y + 5),
+        LOCATION_TEXT,
+        fill=(255, 255, 255, 255),
+        font=_get_font(LOCATION_FONT_SIZE)
+    )
+    overlay = Image.alpha_composite(overlay, text_layer)
 
-    # 姓名位置
-    name_y = first_line_y + 5
-    draw.text((name_date_x, name_y), name_text, fill='white', font=name_font)
+    # 位置图标
+    with Image.open(LOCATION_ICON_PATH) as icon:
+        location_icon = icon.resize((30, 30))
+        # 如果图标有透明通道，保持透明
+        if location_icon.mode != 'RGBA':
+            location_icon = location_icon.convert('RGBA')
+    overlay.alpha_composite(location_icon, (LOCATION_X + 22, LOCATION_Y + 14))
 
-    # 日期位置
-    date_y = first_line_y + 50
-    draw.text((name_date_x, date_y), date_text, fill='white', font=date_font)
+    bbox = overlay.getbbox()
+    return overlay.crop(bbox), (bbox[0], bbox[1])
+
+
+def warm_up_watermark_assets() -> None:
+    """
+    预加载水印所需的字体与固定图层（进程池子进程启动时调用，避免首张图片承担加载开销）
+
+    :raises OSError: 位置图标文件不存在或无法读取时抛出
+    """
+    for size in (TIME_FONT_SIZE, NAME_FONT_SIZE, DATE_FONT_SIZE, LOCATION_FONT_SIZE):
+        _get_font(size)
+    _get_static_overlay()
+
+
+def draw_static_overlay(image: Image.Image) -> None:
+    """把缓存的固定水印图层贴到画布上"""
+    overlay, offset = _get_static_overlay()
+    image.paste(overlay, offset, overlay)
+
+
+class _GlyphAtlas:
+    """
+    进程内的文字遮罩缓存：按 (字号, 文本) 缓存白色文字的 alpha 遮罩，超出容量时按 LRU 淘汰
+
+    每项为 (mask, left, top, advance)：mask 为 uint8 数组，left/top 为相对绘制起点的偏移，
+    advance 为文本的水平步进宽度。
+    """
+
+    def __init__(self, maxsize: int):
+        self._maxsize = maxsize
+        self._items = OrderedDict()
+        self._lock = threading.Lock()
 
-    # 第二行位置信息（写死）
-    location_x = 27
-    location_y = 1794  # 距离底部 108px
-    location_width = 302
-    location_height = 60
+    def get(self, font_size: int, text: str):
+        key = (font_size, text)
+        with self._lock:
+            item = self._items.get(key)
+            if item is not None:
+                self._items.move_to_end(key)
+                return item
 
-    # 绘制位置背景（半透明黑色）
-    draw_rounded_rectangle(draw, location_x, location_y, location_width, location_height, borderRadius, (0, 0, 0),
-                           alpha=102)
+        item = _render_text_mask(font_size, text)
 
-    # 位置文字
-    location_text = 'Q南宁中国锦园'
-    location_text_x = location_x + 65
-    location_text_y = location_y + 5
+        with self._lock:
+            self._items[key] = item
+            self._items.move_to_end(key)
+            while len(self._items) > self._maxsize:
+                self._items.popitem(last=False)
+        return item
 
-    draw.text((location_text_x, location_text_y), location_text, fill='white', font=location_font)
+    def __len__(self):
+        return len(self._items)
 
-    # 位置图标 (使用emoji)
-    icon_x = location_x + 22
-    icon_y = location_y + 14
 
-    location_icon = Image.open("static/location_icon.png")
-    location_icon = location_icon.resize((30, 30))
-    # 如果图标有透明通道，保持透明
-    if location_icon.mode != 'RGBA':
-        location_icon = location_icon.convert('RGBA')
-    image.paste(location_icon, (icon_x, icon_y), location_icon)
+def _render_text_mask(font_size: int, text: str):
+    """用 FreeType 栅格化一段文字，返回 (mask, left, top, advance)"""
+    font = _get_font(font_size)
+    left, top, right, bottom = font.getbbox(text)
+    mask = Image.new("L", (max(right - left, 1), max(bottom - top, 1)), 0)
+    ImageDraw.Draw(mask).text((-left, -top), text, fill=255, font=font)
+    return np.asarray(mask), left, top, font.getlength(text)
+
+
+# 时间 / 日期只由数字、":"、"-"、空格与星期汉字组成，按单字缓存，容量足够容纳全部字形
+_GLYPH_ATLAS = _GlyphAtlas(maxsize=256)
+# 姓名按整串缓存，只保留最近使用的若干个
+_NAME_ATLAS = _GlyphAtlas(maxsize=64)
+
+
+def _blend_mask(canvas: np.ndarray, mask: np.ndarray, x: int, y: int, color=(255, 255, 255)) -> None:
+    """按 alpha 遮罩把纯色文字混合进 RGB 画布（原地修改，越界部分自动裁掉）"""
+    h, w = mask.shape
+    x0, y0 = max(x, 0), max(y, 0)
+    x1, y1 = min(x + w, canvas.shape[1]), min(y + h, canvas.shape[0])
+    if x0 >= x1 or y0 >= y1:
+        return
+
+    alpha = mask[y0 - y:y1 - y, x0 - x:x1 - x, None].astype(np.uint16)
+    region = canvas[y0:y1, x0:x1]
+    ink = np.asarray(color, dtype=np.uint16)
+    region[...] = ((region * (255 - alpha) + ink * alpha + 127) // 255).astype(np.uint8)
+
+
+def _blend_glyphs(canvas: np.ndarray, x: int, y: int, text: str, font_size: int) -> None:
+    """逐字从字形缓存中取遮罩并混合，用于时间 / 日期这类字符集很小的文本"""
+    pen = 0.0
+    for ch in text:
+        mask, left, top, advance = _GLYPH_ATLAS.get(font_size, ch)
+        if ch != " ":
+            _blend_mask(canvas, mask, x + int(round(pen)) + left, y + top)
+        pen += advance
+
+
+def _blend_string(canvas: np.ndarray, x: int, y: int, text: str, font_size: int) -> None:
+    """整串从姓名缓存中取遮罩并混合"""
+    mask, left, top, _ = _NAME_ATLAS.get(font_size, text)
+    _blend_mask(canvas, mask, x + left, y + top)
+
+
+def draw_text_watermark(canvas: np.ndarray, time_info, name) -> None:
+    """
+    绘制文字水印中的动态部分（时间、姓名、日期），直接混合进 numpy 画布
+
+    固定部分（背景、位置图标、位置文字）由 draw_static_overlay 负责，需先于本函数调用。
+    """
+    # 时间文字位置（写死）
+    time_x = FIRST_LINE_X + 15
+    time_y = FIRST_LINE_Y - 4
+    _blend_glyphs(canvas, time_x, time_y, time_info['time'], TIME_FONT_SIZE)
+
+    # 姓名和日期位置（写死）
+    name_date_x = FIRST_LINE_X + 220
+
+    # 姓名位置
+    name_y = FIRST_LINE_Y + 5
+    _blend_string(canvas, name_date_x, name_y, name, NAME_FONT_SIZE)
+
+    # 日期位置
+    date_y = FIRST_LINE_Y + 50
+    date_text = f"{time_info['date']} {time_info['week']}"
+    _blend_glyphs(canvas, name_date_x, date_y, date_text, DATE_FONT_SIZE)
 
 
 def check_need_crop(width, height):
@@ -193,71 +355,185 @@ def calculate_crop_area(width, height):
         }
 
 
-def _load_and_fit_image_fast(image_path: str,
+# TurboJPEG / PIL draft 支持的 DCT 缩放因子，从小到大尝试
+_DCT_SCALING_FACTORS = ((1, 8), (1, 4), (1, 2))
+
+
+def _pick_scaling_factor(src_w: int, src_h: int, min_w: int, min_h: int):
+    """
+    选择解码后仍能覆盖目标尺寸的最小 TurboJPEG 缩放因子
+
+    :param src_w: 原图宽度
+    :param src_h: 原图高度
+    :param min_w: 解码结果至少需要的宽度
+    :param min_h: 解码结果至少需要的高度
+    :returns: (num, denom) 缩放因子；都不满足时返回 None（按原尺寸解码）
+    """
+    supported = getattr(_JPEG, "scaling_factors", ())
+    for num, denom in _DCT_SCALING_FACTORS:
+        if (num, denom) not in supported:
+            continue
+        # 与 libjpeg-turbo 的 TJSCALED 一致：向上取整
+        scaled_w = (src_w * num + denom - 1) // denom
+        scaled_h = (src_h * num + denom - 1) // denom
+        if scaled_w >= min_w and scaled_h >= min_h:
+            return num, denom
+    return None
+
+
+def _fit_cover(img: Image.Image, target_width: int, target_height: int) -> Image.Image:
+    """
+    按 cover 模式（不留白、中心裁剪）把图片缩放到目标尺寸，只对裁剪区域做重采样
+
+    :param img: 源图
+    :param target_width: 目标宽度
+    :param target_height: 目标高度
+    :returns: target_width x target_height 的新图
+    :raises OSError: 源图尺寸非法
+    """
+    src_w, src_h = img.size
+    if src_w <= 0 or src_h <= 0:
+        raise OSError("invalid source image size")
+
+    scale = max(target_width / src_w, target_height / src_h)
+    box_w = target_width / scale
+    box_h = target_height / scale
+    left = (src_w - box_w) / 2
+    top = (src_h - box_h) / 2
+
+    return img.resize(
+        (target_width, target_height),
+        Image.BILINEAR,
+        box=(left, top, left + box_w, top + box_h)
+    )
+
+
+def _load_and_fit_image_fast(image_source: Union[str, bytes, memoryview],
                              canvas_width: int = 1080,
                              canvas_height: int = 1920) -> Image.Image:
     """
     高性能加载图片并按 cover 模式适配到固定画布尺寸（不留白，中心裁剪）
 
-    :param image_path: 原图文件路径
+    - JPEG 按能覆盖画布的最小 DCT 缩放因子解码（TurboJPEG scaling_factor / PIL draft），
+      4000x3000 的手机照片通常只需解码 1/2 尺寸
+    - 横图先按旋转后的画布尺寸裁剪缩放，再旋转，旋转只作用于 1080x1920 的小图
+
+    :param image_source: 原图文件路径，或已在内存中的原图字节（bytes / memoryview）
     :param canvas_width: 目标画布宽度
     :param canvas_height: 目标画布高度
     :returns: 已按 1080x1920 适配好的 PIL.Image 对象
     :raises keyError: 不涉及字典访问，不会抛出 keyError，异常时通常抛 OSError
     """
-    if _JPEG is not None:
-        with open(image_path, "rb") as f:
+    if isinstance(image_source, str):
+        with open(image_source, "rb") as f:
             buf = f.read()
-        np_img = _JPEG.decode(buf, pixel_format=TJPF_RGB)
-        img = Image.fromarray(np_img, mode="RGB")
     else:
-        img = Image.open(image_path).convert("RGB")
-
-    if img.width > img.height:
-        img = img.rotate(-90, expand=True)
-
-    src_w, src_h = img.size
-    if src_w <= 0 or src_h <= 0:
-        raise OSError("invalid source image size")
+        buf = image_source
+
+    img = None
+    if _JPEG is not None and buf[:2] == b"\xff\xd8":
+        src_w, src_h, _, _ = _JPEG.decode_header(buf)
+        landscape = src_w > src_h
+        need_w, need_h = (canvas_height, canvas_width) if landscape else (canvas_width, canvas_height)
+        np_img = _JPEG.decode(
+            buf,
+            pixel_format=TJPF_RGB,
+            scaling_factor=_pick_scaling_factor(src_w, src_h, need_w, need_h)
+        )
+        img = Image.fromarray(np_img, mode="RGB")
 
-    scale_w = canvas_width / src_w
-    scale_h = canvas_height / src_h
-    scale = max(scale_w, scale_h)
+    if img is None:
+        img = Image.open(io.BytesIO(buf))
+        landscape = img.width > img.height
+        need_w, need_h = (canvas_height, canvas_width) if landscape else (canvas_width, canvas_height)
+        # 仅对 JPEG 生效：解码时直接按 1/2、1/4、1/8 缩小，结果仍不小于 need_w x need_h
+        img.draft("RGB", (need_w, need_h))
+        img = img.convert("RGB")
 
-    new_w = int(src_w * scale)
-    new_h = int(src_h * scale)
-    if new_w <= 0 or new_h <= 0:
-        raise OSError("invalid scaled size")
+    # 横图：先适配到旋转后的画布，再顺时针旋转 90 度
+    img = _fit_cover(img, need_w, need_h)
+    if landscape:
+        img = img.transpose(Image.Transpose.ROTATE_270)
 
-    img = img.resize((new_w, new_h), Image.BILINEAR)
+    return img
 
-    left = (new_w - canvas_width) // 2
-    top = (new_h - canvas_height) // 2
-    right = left + canvas_width
-    bottom = top + canvas_height
 
-    img = img.crop((left, top, right, bottom))
-    return img
+def encode_jpeg(img: Union[Image.Image, np.ndarray], quality: int = WATERMARK_JPEG_QUALITY) -> bytes:
+    """
+    把 RGB 图片编码为 JPEG 字节，TurboJPEG 可用时直接从 numpy 缓冲区编码
 
+    :param img: RGB 模式的 PIL.Image，或 HxWx3 的 uint8 数组
+    :param quality: JPEG 质量 1-100
+    :returns: JPEG 字节
+    """
+    if _JPEG is not None:
+        # 4:2:0 采样，与 PIL 在 quality<=90 时的默认值一致
+        return _JPEG.encode(
+            np.asarray(img),
+            quality=quality,
+            pixel_format=TJPF_RGB,
+            jpeg_subsample=TJSAMP_420
+        )
+
+    if isinstance(img, np.ndarray):
+        img = Image.fromarray(img, mode="RGB")
+
+    buf = io.BytesIO()
+    img.save(buf, "JPEG", quality=quality, optimize=False)
+    return buf.getvalue()
+
+
+def encode_jpeg_within(img: Union[Image.Image, np.ndarray],
+                       max_bytes: int,
+                       max_quality: int = WATERMARK_JPEG_QUALITY,
+                       min_quality: int = WATERMARK_MIN_JPEG_QUALITY) -> bytes:
+    """
+    在 [min_quality, max_quality] 内二分查找不超过 max_bytes 的最高质量并编码
 
-def add_watermark_to_image(original_image_path: str,
-                           name: str = "梁振卓",
-                           user_number: str = "2409840",
-                           base_date: str = None,
-                           base_time: str = None,
-                           output_path: str = None,
-                           minute_offset: int = 0) -> str:
+    :param img: RGB 模式的 PIL.Image，或 HxWx3 的 uint8 数组
+    :param max_bytes: 目标文件大小上限（字节）
+    :param max_quality: 最高质量，默认质量下已满足大小要求时直接返回
+    :param min_quality: 最低质量；该质量仍超限时返回该质量的结果
+    :returns: JPEG 字节
+    """
+    data = encode_jpeg(img, max_quality)
+    if len(data) <= max_bytes:
+        return data
+
+    best = None
+    lo, hi = min_quality, max_quality - 1
+    while lo <= hi:
+        mid = (lo + hi) // 2
+        candidate = encode_jpeg(img, mid)
+        if len(candidate) <= max_bytes:
+            best = candidate
+            lo = mid + 1
+        else:
+            hi = mid - 1
+
+    return best if best is not None else encode_jpeg(img, min_quality)
+
+
+def render_watermark(image_data: Union[bytes, memoryview],
+                     name: str = "梁振卓",
+                     user_number: str = "2409840",
+                     base_date: str = None,
+                     base_time: str = None,
+                     minute_offset: int = 0,
+                     quality: int = WATERMARK_JPEG_QUALITY,
+                     max_bytes: Optional[int] = None) -> bytes:
     """
-    给单张图片添加水印（竖版 1080x1920，右下角二维码 + 文本水印）
+    在内存中给单张图片添加水印（竖版 1080x1920，右下角二维码 + 文本水印），不读写任何文件
 
-    :param original_image_path: 原始图片路径
+    :param image_data: 原图字节（JPEG / PNG 等 PIL 可识别的格式）
     :param name: 姓名，用于水印文本与加密数据
     :param user_number: 工号/用户编号，用于水印加密数据
     :param base_date: 基准日期 YYYY-MM-DD，None 时为当天
     :param base_time: 基准时间 HH:MM，None 时为当前时间
-    :param output_path: 输出文件路径，为 None 时自动生成
     :param minute_offset: 在基准时间上偏移的分钟数，用于生成不同时间戳
-    :returns: 最终生成的水印图片路径
+    :param quality: JPEG 输出质量
+    :param max_bytes: 输出大小上限（字节），设置后在 quality 以内自动降低质量以满足上限
+    :returns: 水印图片的 JPEG 字节
     :raises keyError: 内部依赖函数如访问配置字典时可能抛出 keyError
     """
     today = datetime.today()
@@ -271,15 +547,12 @@ def add_watermark_to_image(original_image_path: str,
 
     canvas_width = 1080
     canvas_height = 1920
-    scale = canvas_width / 750.0
 
     base_image = _load_and_fit_image_fast(
-        original_image_path,
+        image_data,
         canvas_width=canvas_width,
         canvas_height=canvas_height
     )
-    draw = ImageDraw.Draw(base_image)
-
     time_info = calculate_time(base_date, base_time, minute_offset)
 
     watermark_data = create_watermark_data(
@@ -298,51 +571,90 @@ def add_watermark_to_image(original_image_path: str,
     qr_x = canvas_width - qr_size
     qr_y = canvas_height - qr_size
 
-    draw_rounded_rectangle(
-        draw,
-        qr_x,
-        qr_y,
-        qr_size,
-        qr_size,
-        0,
-        (255, 255, 0),
-        alpha=255
-    )
+    draw_static_overlay(base_image)
+
+    # 之后的步骤直接在 numpy 画布上进行，编码阶段复用同一缓冲区
+    canvas = np.array(base_image)
+    draw_text_watermark(canvas, time_info, name)
+    blit_qrcode(canvas, generate_qrcode_matrix(qr_data, qr_size), qr_x, qr_y)
+
+    if max_bytes:
+        return encode_jpeg_within(canvas, max_bytes, max_quality=quality)
+    return encode_jpeg(canvas, quality)
+
+
+def add_watermark_to_image(original_image_path: Union[str, bytes, memoryview],
+                           name: str = "梁振卓",
+                           user_number: str = "2409840",
+                           base_date: str = None,
+                           base_time: str = None,
+                           output_path: str = None,
+                           minute_offset: int = 0,
+                           quality: int = WATERMARK_JPEG_QUALITY,
+                           max_bytes: Optional[int] = None) -> str:
+    """
+    给单张图片添加水印并写入文件，渲染逻辑见 render_watermark
 
-    qr_image = generate_qrcode(qr_data, qr_size)
-    base_image.paste(qr_image, (qr_x, qr_y))
+    :param original_image_path: 原始图片路径，或已在内存中的原图字节
+    :param name: 姓名，用于水印文本与加密数据
+    :param user_number: 工号/用户编号，用于水印加密数据
+    :param base_date: 基准日期 YYYY-MM-DD，None 时为当天
+    :param base_time: 基准时间 HH:MM，None 时为当前时间
+    :param output_path: 输出文件路径，为 None 时自动生成
+    :param minute_offset: 在基准时间上偏移的分钟数，用于生成不同时间戳
+    :param quality: JPEG 输出质量
+    :param max_bytes: 输出文件大小上限（字节），设置后在 quality 以内自动降低质量以满足上限
+    :returns: 最终生成的水印图片路径
+    :raises keyError: 内部依赖函数如访问配置字典时可能抛出 keyError
+    """
+    if isinstance(original_image_path, str):
+        with open(original_image_path, "rb") as f:
+            image_data = f.read()
+    else:
+        image_data = original_image_path
 
-    draw_text_watermark(
-        draw,
-        base_image,
-        time_info,
-        name,
-        scale
+    data = render_watermark(
+        image_data,
+        name=name,
+        user_number=user_number,
+        base_date=base_date,
+        base_time=base_time,
+        minute_offset=minute_offset,
+        quality=quality,
+        max_bytes=max_bytes
     )
 
     if output_path is None:
         output_path = f"watermarked_{int(datetime.now(TZ).timestamp())}.jpg"
 
-    base_image.save(output_path, "JPEG", quality=85, optimize=False)
+    with open(output_path, "wb") as f:
+        f.write(data)
     return output_path
 
 
-def watermark_runner(args: Tuple[str, str, str, str, str, str]) -> str:
+def watermark_runner(args: Tuple[Union[str, bytes], str, str, str, str, Optional[str], bool]) -> Union[str, bytes, None]:
     """
-    独立任务 runner：处理单张图片并输出到指定路径，供多进程池调用
+    独立任务 runner：处理单张图片并在本进程内写出结果文件，供多进程池调用
 
-    :param args: 六元组 (ori_path, name, user_number, base_date_str, time_str, out_file)
-    :returns: 已生成水印图片的输出路径
-    :raises keyError: 内部调用 add_watermark_to_image 时可能抛出 keyError
+    :param args: 七元组 (ori_path 或原图字节, name, user_number, base_date_str, time_str, out_file, return_bytes)；
+                 out_file 为 None 时不落盘；return_bytes 为 True 时把 JPEG 字节也传回父进程（结果缓存 / 拼图用）
+    :returns: return_bytes 为 True 时返回 JPEG 字节，否则返回输出路径
+    :raises keyError: 内部调用 render_watermark 时可能抛出 keyError
     """
-    ori_path, name, user_number, base_date_str, time_str, out_file = args
-    add_watermark_to_image(
-        original_image_path=ori_path,
+    ori_path, name, user_number, base_date_str, time_str, out_file, return_bytes = args
+    if isinstance(ori_path, str):
+        with open(ori_path, "rb") as f:
+            ori_path = f.read()
+    data = render_watermark(
+        ori_path,
         name=name,
         user_number=user_number,
         base_date=base_date_str,
         base_time=time_str,
-        output_path=out_file,
         minute_offset=0
     )
-    return out_file
+
+    # 各子进程并行落盘，父进程只在需要时接收字节
+    if out_file is not None:
+        write_file_atomic(out_file, data)
+    return data if return_bytes else out_file
@@ -0,0 +1,33 @@
+import pytest
+from peewee import SqliteDatabase
+
+import config
+from db import File, UploadSession, UploadPart, ReviewItem
+
+MODELS = [File, UploadSession, UploadPart, ReviewItem]
+
+
+class _UpsertSqliteDatabase(SqliteDatabase):
+    """
+    线上用 MySQL 的 ON DUPLICATE KEY UPDATE（不指定冲突列）；
+    SQLite 的 upsert 必须给出冲突列，这里按模型的唯一索引补上，语义与 MySQL 一致
+    """
+
+    def conflict_update(self, oc, query):
+        if oc._update and not oc._conflict_target:
+            unique = [fields for fields, is_unique in query.table._meta.indexes if is_unique]
+            if unique:
+                oc._conflict_target = [query.table._meta.fields[name] for name in unique[0]]
+        return super().conflict_update(oc, query)
+
+
+@pytest.fixture
+def sqlite_db(tmp_path):
+    """把上传 / 审核相关模型临时绑定到 SQLite，结束后恢复为 config.db"""
+    database = _UpsertSqliteDatabase(str(tmp_path / "test.db"), check_same_thread=False)
+    database.bind(MODELS)
+    database.connect()
+    database.create_tables(MODELS)
+    yield database
+    database.close()
+    config.db.bind(MODELS)
@@ -0,0 +1,53 @@
+"""
+文件响应：ETag / 304 与 Range（send_file 模式，离线运行）
+"""
+import os
+
+import pytest
+from flask import Flask
+
+from utils.file_response import send_file_cached
+
+DATA = os.urandom(1000)
+
+
+@pytest.fixture
+def client(tmp_path):
+    path = tmp_path / "app.apk"
+    path.write_bytes(DATA)
+
+    app = Flask(__name__)
+    app.add_url_rule("/file", "file", lambda: send_file_cached(str(path), as_attachment=True))
+    return app.test_client()
+
+
+def test_full_response_and_not_modified(client):
+    resp = client.get("/file")
+    assert resp.status_code == 200
+    assert resp.data == DATA
+    etag = resp.headers["ETag"]
+
+    resp = client.get("/file", headers={"If-None-Match": etag})
+    assert resp.status_code == 304
+    assert resp.headers["ETag"] == etag
+
+
+def test_range_request(client):
+    resp = client.get("/file", headers={"Range": "bytes=100-199"})
+    assert resp.status_code == 206
+    assert resp.data == DATA[100:200]
+    assert resp.headers["Content-Range"] == f"bytes 100-199/{len(DATA)}"
+    assert resp.headers["Accept-Ranges"] == "bytes"
+
+
+def test_if_range(client):
+    etag = client.get("/file").headers["ETag"]
+
+    resp = client.get("/file", headers={"Range": "bytes=0-9", "If-Range": etag})
+    assert resp.status_code == 206
+    assert resp.data == DATA[:10]
+
+    # 文件已变化：If-Range 不匹配时返回完整内容
+    resp = client.get("/file", headers={"Range": "bytes=0-9", "If-Range": "stale"})
+    assert resp.status_code == 200
+    assert resp.data == DATA
@@ -0,0 +1,206 @@
+"""
+图像处理基准测试：水印、解码适配、二维码、拼图
+
+离线运行（不依赖服务端），使用合成图片语料，输出各阶段耗时分位数与峰值 RSS 增量，
+并按阈值做回归检查：
+
+    python -m pytest -q -m benchmark tests/test_imaging_benchmark.py
+
+环境变量：
+- BENCH_ROUNDS: 每项重复次数（默认 5）
+- BENCH_THRESHOLD_SCALE: 阈值整体倍率，慢机器可设为 2（默认 1）
+"""
+import os
+import statistics
+import threading
+import time
+
+import numpy as np
+import psutil
+import pytest
+from PIL import Image
+
+from tasks.watermark_task import (
+    _load_and_fit_image_fast,
+    add_watermark_to_image,
+    generate_qrcode,
+)
+from utils.merge import merge_images_grid
+
+pytestmark = pytest.mark.benchmark
+
+ROUNDS = int(os.getenv("BENCH_ROUNDS", "5"))
+THRESHOLD_SCALE = float(os.getenv("BENCH_THRESHOLD_SCALE", "1"))
+
+# 各阶段 p95 耗时上限（毫秒）
+P95_THRESHOLDS_MS = {
+    "load_and_fit": 600,
+    "add_watermark": 1200,
+    "generate_qrcode": 60,
+    "merge_images_grid": 2500,
+}
+
+# 合成语料：(名称, 宽, 高, 格式)
+CORPUS = [
+    ("jpeg_4000x3000_landscape", 4000, 3000, "JPEG"),
+    ("jpeg_3000x4000_portrait", 3000, 4000, "JPEG"),
+    ("jpeg_1080x1920", 1080, 1920, "JPEG"),
+    ("png_1920x1080_landscape", 1920, 1080, "PNG"),
+    ("png_800x600_small", 800, 600, "PNG"),
+]
+
+_results = []
+
+
+class _RssSampler:
+    """后台线程采样 RSS，统计一段代码执行期间的峰值增量"""
+
+    def __init__(self, interval: float = 0.005):
+        self._proc = psutil.Process()
+        self._interval = interval
+        self._stop = threading.Event()
+        self._thread = None
+        self.baseline = 0
+        self.peak = 0
+
+    def __enter__(self):
+        self.baseline = self.peak = self._proc.memory_info().rss
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+        return self
+
+    def _run(self):
+        while not self._stop.is_set():
+            self.peak = max(self.peak, self._proc.memory_info().rss)
+            time.sleep(self._interval)
+
+    def __exit__(self, *exc):
+        self._stop.set()
+        self._thread.join()
+        self.peak = max(self.peak, self._proc.memory_info().rss)
+
+    @property
+    def peak_delta_mb(self) -> float:
+        return (self.peak - self.baseline) / (1024 * 1024)
+
+
+def _bench(stage: str, case: str, func, rounds: int = ROUNDS) -> dict:
+    """预热一次后重复执行 func，记录耗时分位数与峰值 RSS 增量"""
+    func()
+
+    timings = []
+    with _RssSampler() as rss:
+        for _ in range(rounds):
+            start = time.perf_counter()
+            func()
+            timings.append((time.perf_counter() - start) * 1000)
+
+    timings.sort()
+    result = {
+        "stage": stage,
+        "case": case,
+        "min": timings[0],
+        "p50": statistics.median(timings),
+        "p95": timings[min(len(timings) - 1, int(round(0.95 * (len(timings) - 1))))],
+        "max": timings[-1],
+        "rss_mb": rss.peak_delta_mb,
+    }
+    _results.append(result)
+    return result
+
+
+def _assert_within_threshold(result: dict):
+    limit = P95_THRESHOLDS_MS[result["stage"]] * THRESHOLD_SCALE
+    assert result["p95"] <= limit, (
+        f"{result['stage']}[{result['case']}] p95={result['p95']:.1f}ms 超过阈值 {limit:.0f}ms"
+    )
+
+
+@pytest.fixture(scope="module", autouse=True)
+def _report(request):
+    """模块结束时输出 pytest-benchmark 风格的汇总表"""
+    yield
+    reporter = request.config.pluginmanager.get_plugin("terminalreporter")
+    if reporter is None or not _results:
+        return
+
+    capture = request.config.pluginmanager.get_plugin("capturemanager")
+    with capture.global_and_fixture_disabled():
+        reporter.write_line("")
+        reporter.write_sep("-", f"imaging benchmark ({ROUNDS} rounds, times in ms)")
+        reporter.write_line(
+            f"{'stage':<20}{'case':<28}{'min':>9}{'p50':>9}{'p95':>9}{'max':>9}{'rss+MB':>9}"
+        )
+        for r in _results:
+            reporter.write_line(
+                f"{r['stage']:<20}{r['case']:<28}{r['min']:>9.1f}{r['p50']:>9.1f}"
+                f"{r['p95']:>9.1f}{r['max']:>9.1f}{r['rss_mb']:>9.1f}"
+            )
+
+
+@pytest.fixture(scope="module")
+def corpus(tmp_path_factory):
+    """生成合成照片语料（低频噪声放大，接近真实照片的压缩率）"""
+    base = tmp_path_factory.mktemp("imaging_corpus")
+    rng = np.random.default_rng(20251017)
+    paths = {}
+    for name, w, h, fmt in CORPUS:
+        noise = (rng.random((max(h // 40, 1), max(w // 40, 1), 3)) * 255).astype(np.uint8)
+        img = Image.fromarray(noise).resize((w, h), Image.BICUBIC)
+        path = base / f"{name}.{fmt.lower()}"
+        if fmt == "JPEG":
+            img.save(path, fmt, quality=90)
+        else:
+            img.save(path, fmt)
+        paths[name] = str(path)
+    return paths
+
+
+@pytest.mark.parametrize("case", [c[0] for c in CORPUS])
+def test_bench_load_and_fit(corpus, case):
+    result = _bench("load_and_fit", case, lambda: _load_and_fit_image_fast(corpus[case]))
+    assert _load_and_fit_image_fast(corpus[case]).size == (1080, 1920)
+    _assert_within_threshold(result)
+
+
+@pytest.mark.parametrize("case", [c[0] for c in CORPUS])
+def test_bench_add_watermark(corpus, case, tmp_path):
+    out = str(tmp_path / "out.jpg")
+
+    def run():
+        add_watermark_to_image(
+            corpus[case],
+            name="基准测试",
+            user_number="2409840",
+            base_date="2025-10-17",
+            base_time="09:41",
+            output_path=out,
+        )
+
+    result = _bench("add_watermark", case, run)
+    with Image.open(out) as img:
+        assert img.size == (1080, 1920)
+    _assert_within_threshold(result)
+
+
+def test_bench_generate_qrcode():
+    payload = '{"text": "%s", "version": "v1.0"}' % ("A" * 160)
+    result = _bench("generate_qrcode", "260px", lambda: generate_qrcode(payload, 260), rounds=ROUNDS * 10)
+    assert generate_qrcode(payload, 260).size == (260, 260)
+    _assert_within_threshold(result)
+
+
+@pytest.mark.parametrize("count", [4, 9])
+def test_bench_merge_images_grid(corpus, count, tmp_path):
+    watermarked = []
+    names = [c[0] for c in CORPUS]
+    for i in range(count):
+        out = str(tmp_path / f"wm_{i}.jpg")
+        add_watermark_to_image(corpus[names[i % len(names)]], base_date="2025-10-17", base_time="09:41",
+                               output_path=out)
+        watermarked.append(out)
+
+    result = _bench("merge_images_grid", f"{count}_images", lambda: merge_images_grid(watermarked).close())
+    merged = merge_images_grid(watermarked)
+    assert merged.width == 1500
+    _assert_within_threshold(result)
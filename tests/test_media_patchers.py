@@ -0,0 +1,231 @@
+"""
+EXIF / MP4 时间原地修改：只改元数据字节，像素与媒体数据保持不变
+"""
+import os
+import struct
+import subprocess
+from datetime import datetime
+
+import numpy as np
+import pytest
+from PIL import Image
+
+from config import TZ
+from utils.jpeg_exif import (
+    TAG_DATETIME, TAG_DATETIME_DIGITIZED, TAG_DATETIME_ORIGINAL, TAG_EXIF_IFD,
+    patch_exif_datetime_in_place, rewrite_exif_datetime_segment,
+)
+from utils.mp4_atoms import MAC_EPOCH_OFFSET, find_boxes, iter_boxes, patch_mp4_creation_time
+from utils.storage import fix_video_metadata
+
+NEW_VALUE = "2026:01:02 03:04:05"
+
+
+# =========================
+# JPEG EXIF
+# =========================
+
+def _write_jpeg(path, with_exif: bool):
+    pixels = np.random.default_rng(0).integers(0, 255, (120, 160, 3), dtype=np.uint8)
+    img = Image.fromarray(pixels)
+    kwargs = {}
+    if with_exif:
+        exif = Image.Exif()
+        exif[TAG_DATETIME] = "2020:01:01 00:00:00"
+        exif_ifd = exif.get_ifd(TAG_EXIF_IFD)
+        exif_ifd[TAG_DATETIME_ORIGINAL] = "2020:01:01 00:00:00"
+        exif_ifd[TAG_DATETIME_DIGITIZED] = "2020:01:01 00:00:00"
+        exif[TAG_EXIF_IFD] = exif_ifd
+        kwargs["exif"] = exif.tobytes()
+    img.save(path, "JPEG", quality=90, **kwargs)
+
+
+def _datetimes(path):
+    with Image.open(path) as img:
+        exif = img.getexif()
+        exif_ifd = exif.get_ifd(TAG_EXIF_IFD)
+        return exif.get(TAG_DATETIME), exif_ifd.get(TAG_DATETIME_ORIGINAL), exif_ifd.get(TAG_DATETIME_DIGITIZED)
+
+
+def _scan_data(path):
+    """SOS 之后的压缩数据"""
+    with open(path, "rb") as f:
+        data = f.read()
+    return data[data.index(b"\xff\xda"):]
+
+
+def test_patch_exif_in_place(tmp_path):
+    path = str(tmp_path / "a.jpg")
+    _write_jpeg(path, with_exif=True)
+    size = os.path.getsize(path)
+    scan = _scan_data(path)
+
+    assert patch_exif_datetime_in_place(path, NEW_VALUE)
+    assert _datetimes(path) == (NEW_VALUE,) * 3
+    assert os.path.getsize(path) == size
+    assert _scan_data(path) == scan
+
+
+def test_rewrite_exif_segment_without_existing_exif(tmp_path):
+    path = str(tmp_path / "b.jpg")
+    _write_jpeg(path, with_exif=False)
+    scan = _scan_data(path)
+
+    assert not patch_exif_datetime_in_place(path, NEW_VALUE)
+    assert rewrite_exif_datetime_segment(path, NEW_VALUE)
+    assert _datetimes(path) == (NEW_VALUE,) * 3
+    assert _scan_data(path) == scan
+
+    # 重建后的 APP1 已带齐三个标签，之后可以原地修改
+    assert patch_exif_datetime_in_place(path, "2027:01:01 00:00:00")
+
+
+def test_exif_patchers_skip_non_jpeg(tmp_path):
+    path = str(tmp_path / "c.png")
+    Image.new("RGB", (8, 8)).save(path)
+    assert not patch_exif_datetime_in_place(path, NEW_VALUE)
+    assert not rewrite_exif_datetime_segment(path, NEW_VALUE)
+
+
+# =========================
+# MP4 creation_time
+# =========================
+
+def _box(box_type: bytes, body: bytes) -> bytes:
+    return struct.pack(">I4s", 8 + len(body), box_type) + body
+
+
+def _full_box_v0(box_type: bytes, body_size: int) -> bytes:
+    # version 0：version/flags 后紧跟 32 位 creation_time / modification_time
+    return _box(box_type, b"\x00" * body_size)
+
+
+def _moov(extra: bytes = b"", trak_extra: bytes = b"") -> bytes:
+    mdia = _box(b"mdia", _full_box_v0(b"mdhd", 24))
+    trak = _box(b"trak", _full_box_v0(b"tkhd", 84) + mdia + trak_extra)
+    return _box(b"moov", _full_box_v0(b"mvhd", 100) + trak + extra)
+
+
+MDAT = _box(b"mdat", os.urandom(4096))
+FTYP = _box(b"ftyp", b"isom\x00\x00\x02\x00isomiso2mp41")
+
+
+def _creation_times(path):
+    size = os.path.getsize(path)
+    with open(path, "rb") as f:
+        moov_offset, moov_header, moov_size = next(find_boxes(f, 0, size, (b"moov",)))
+        result = []
+        for box_path in ((b"mvhd",), (b"trak", b"tkhd"), (b"trak", b"mdia", b"mdhd")):
+            for offset, header_size, _ in find_boxes(f, moov_offset + moov_header, moov_offset + moov_size, box_path):
+                f.seek(offset + header_size + 4)
+                result.append(struct.unpack(">II", f.read(8)))
+        return result
+
+
+def _top_level(path):
+    with open(path, "rb") as f:
+        return [t for t, _, _, _ in iter_boxes(f, 0, os.path.getsize(path))]
+
+
+@pytest.fixture
+def when():
+    return datetime(2026, 3, 4, 5, 6, 7, tzinfo=TZ)
+
+
+def test_patch_mp4_appends_moov_when_last(tmp_path, when):
+    path = str(tmp_path / "v.mp4")
+    with open(path, "wb") as f:
+        f.write(FTYP + MDAT + _moov())
+
+    assert patch_mp4_creation_time(path, when)
+
+    mac_ts = int(when.timestamp()) + MAC_EPOCH_OFFSET
+    assert _creation_times(path) == [(mac_ts, mac_ts)] * 3
+    assert _top_level(path) == [b"ftyp", b"mdat", b"free", b"moov"]
+    with open(path, "rb") as f:
+        assert f.read()[len(FTYP):len(FTYP) + len(MDAT)] == MDAT
+
+    # 已有同长度 ©day：第二次原地覆盖，文件大小不变
+    size = os.path.getsize(path)
+    assert patch_mp4_creation_time(path, when.replace(year=2027))
+    assert os.path.getsize(path) == size
+    mac_ts = int(when.replace(year=2027).timestamp()) + MAC_EPOCH_OFFSET
+    assert _creation_times(path) == [(mac_ts, mac_ts)] * 3
+
+
+def test_patch_mp4_refuses_to_move_mdat(tmp_path, when):
+    path = str(tmp_path / "faststart.mp4")
+    original = FTYP + _moov() + MDAT
+    with open(path, "wb") as f:
+        f.write(original)
+
+    assert not patch_mp4_creation_time(path, when)
+    with open(path, "rb") as f:
+        assert f.read() == original
+
+
+@pytest.mark.parametrize("extra, trak_extra", [
+    # mdta 键值（com.apple.quicktime.creationdate 等）
+    (_box(b"meta", b"\x00" * 4 + _box(b"keys", b"")), b""),
+    # udta/meta/ilst 里的 ©day
+    (_box(b"udta", _box(b"meta", b"\x00" * 4 + _box(b"ilst", b""))), b""),
+    # ©day 以外的日期 atom
+    (_box(b"udta", _box(b"date", b"2020-01-01")), b""),
+    # 轨道级 udta 日期
+    (b"", _box(b"udta", _box(b"\xa9day", b"2020"))),
+])
+def test_patch_mp4_leaves_other_dates_to_ffmpeg(tmp_path, when, extra, trak_extra):
+    path = str(tmp_path / "meta.mp4")
+    original = FTYP + MDAT + _moov(extra, trak_extra)
+    with open(path, "wb") as f:
+        f.write(original)
+
+    assert not patch_mp4_creation_time(path, when)
+    with open(path, "rb") as f:
+        assert f.read() == original
+
+
+def test_patch_mp4_without_moov(tmp_path, when):
+    path = str(tmp_path / "broken.mp4")
+    with open(path, "wb") as f:
+        f.write(FTYP + MDAT)
+    assert not patch_mp4_creation_time(path, when)
+
+
+def test_fix_video_metadata_rename_when_source_not_kept(tmp_path):
+    src = str(tmp_path / "src.mp4")
+    dst = str(tmp_path / "dst.mp4")
+    with open(src, "wb") as f:
+        f.write(FTYP + MDAT + _moov())
+
+    fix_video_metadata(src, dst, keep_src=False)
+
+    assert not os.path.exists(src)
+    assert _top_level(dst) == [b"ftyp", b"mdat", b"free", b"moov"]
+
+
+def test_fix_video_metadata_keep_src_runs_ffmpeg_from_source(tmp_path, monkeypatch):
+    src = str(tmp_path / "src.mp4")
+    dst = str(tmp_path / "dst.mp4")
+    original = FTYP + MDAT + _moov()
+    with open(src, "wb") as f:
+        f.write(original)
+
+    calls = []
+
+    def fake_run(cmd, **kwargs):
+        # 不应先把源文件整份拷贝到 dst
+        assert not os.path.exists(dst)
+        calls.append(cmd)
+        with open(cmd[-1], "wb") as out:
+            out.write(b"remuxed")
+        return subprocess.CompletedProcess(cmd, 0, b"", b"")
+
+    monkeypatch.setattr("utils.storage.subprocess.run", fake_run)
+    fix_video_metadata(src, dst)
+
+    assert calls and calls[0][calls[0].index("-i") + 1] == src
+    with open(src, "rb") as f:
+        assert f.read() == original
+    with open(dst, "rb") as f:
+        assert f.read() == b"remuxed"
@@ -0,0 +1,56 @@
+"""
+水印结果进程内读缓存：TTL、字节上限，ETag 与磁盘文件一致
+"""
+import os
+
+from utils.file_response import file_etag
+from utils.result_store import ResultStore
+
+
+def put_file(store, tmp_path, key, data):
+    path = tmp_path / f"{key}.jpg"
+    path.write_bytes(data)
+    store.put(key, data, os.stat(path))
+    return path
+
+
+def test_put_and_get(tmp_path):
+    store = ResultStore(ttl=60, max_bytes=1024)
+    path = put_file(store, tmp_path, "a", b"jpeg-bytes")
+
+    data, etag, mtime = store.get("a")
+    stat = os.stat(path)
+    assert data == b"jpeg-bytes"
+    # 与 send_file_cached 对同一文件给出的头一致
+    assert etag == file_etag(stat)
+    assert mtime == stat.st_mtime
+    assert store.get("missing") is None
+
+
+def test_expired_items_are_dropped(tmp_path, monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr("utils.result_store.time.time", lambda: now[0])
+    store = ResultStore(ttl=10, max_bytes=1024)
+    put_file(store, tmp_path, "a", b"x")
+
+    now[0] += 9
+    assert store.get("a") is not None
+    now[0] += 2
+    assert store.get("a") is None
+
+
+def test_byte_budget_evicts_oldest(tmp_path):
+    store = ResultStore(ttl=60, max_bytes=10)
+    put_file(store, tmp_path, "a", b"1234")
+    put_file(store, tmp_path, "b", b"5678")
+    put_file(store, tmp_path, "c", b"90ab")
+
+    assert store.get("a") is None
+    assert store.get("b") is not None
+    assert store.get("c") is not None
+
+
+def test_oversized_item_not_cached(tmp_path):
+    store = ResultStore(ttl=60, max_bytes=4)
+    put_file(store, tmp_path, "a", b"12345")
+    assert store.get("a") is None
@@ -0,0 +1,113 @@
+"""
+审核索引：登记 / 单条与批量审核 / 清除 / 分页 / 重建（SQLite + 临时目录，离线运行）
+"""
+import os
+
+import pytest
+
+from db import ReviewItem
+from utils import review_index
+
+
+@pytest.fixture
+def reviews(sqlite_db, tmp_path, monkeypatch):
+    # REVIEW_ROOT 与 find_review_dir_by_filename 都是相对 storage/reviews 的路径
+    monkeypatch.chdir(tmp_path)
+    return tmp_path / "storage" / "reviews"
+
+
+def add_pending(file_path, filename, register=True):
+    d = review_index.review_dir("pending", file_path)
+    os.makedirs(d, exist_ok=True)
+    with open(os.path.join(d, filename), "wb") as f:
+        f.write(b"data")
+    if register:
+        review_index.record_review(filename, file_path)
+
+
+def statuses():
+    return {(row.file_path, row.filename): row.status for row in ReviewItem.select()}
+
+
+def test_record_review_is_idempotent(reviews):
+    add_pending("aaa/bbb", "1.jpg")
+    review_index.record_review("1.jpg", "/aaa/bbb")
+    assert statuses() == {("/aaa/bbb", "1.jpg"): "pending"}
+
+
+def test_move_review(reviews):
+    add_pending("/aaa/bbb", "1.jpg")
+    src, dst = review_index.move_review("1.jpg", "approve")
+
+    assert (src, dst) == ("pending/aaa/bbb", "approve/aaa/bbb")
+    assert (reviews / "approve" / "aaa" / "bbb" / "1.jpg").exists()
+    assert not (reviews / "pending" / "aaa" / "bbb").exists()
+    assert statuses() == {("/aaa/bbb", "1.jpg"): "approve"}
+
+    with pytest.raises(FileNotFoundError):
+        review_index.move_review("1.jpg", "approve")
+
+
+def test_unindexed_pending_file_is_found_and_registered(reviews):
+    add_pending("/x/y", "2.jpg", register=False)
+    assert review_index.find_pending_file_path("2.jpg") == "/x/y"
+    assert statuses() == {("/x/y", "2.jpg"): "pending"}
+
+
+def test_move_reviews_batch(reviews):
+    add_pending("/a", "1.jpg")
+    add_pending("/a", "2.jpg")
+    add_pending("/b", "3.jpg")
+
+    results = review_index.move_reviews(["1.jpg", "2.jpg", "3.jpg", "missing.jpg"], "reject")
+
+    assert [r["ok"] for r in results] == [True, True, True, False]
+    assert results[3]["error"] == "未找到文件: missing.jpg"
+    assert (reviews / "reject" / "a" / "2.jpg").exists()
+    assert (reviews / "reject" / "b" / "3.jpg").exists()
+    assert set(statuses().values()) == {"reject"}
+
+
+def test_clear_approved(reviews):
+    add_pending("/a", "1.jpg")
+    add_pending("/b", "2.jpg")
+    review_index.move_reviews(["1.jpg", "2.jpg"], "approve")
+
+    review_index.clear_approved("a")
+    assert not (reviews / "approve" / "a").exists()
+    assert statuses() == {("/b", "2.jpg"): "approve"}
+
+    review_index.clear_approved_many(["/b"])
+    assert not (reviews / "approve" / "b").exists()
+    assert statuses() == {}
+
+
+def test_listing_and_pagination(reviews):
+    for i in range(5):
+        add_pending(f"/p{i}", f"{i}.jpg")
+    review_index.move_reviews(["3.jpg", "1.jpg"], "approve")
+
+    items, total = review_index.list_pending()
+    assert total == 3
+    assert [item.filename for item in items] == ["0.jpg", "2.jpg", "4.jpg"]
+
+    items, total = review_index.list_pending(page=2, page_size=2)
+    assert total == 3
+    assert [item.filename for item in items] == ["4.jpg"]
+
+    paths, total = review_index.list_approved_paths(page=1, page_size=1)
+    assert (paths, total) == (["/p1"], 2)
+
+
+def test_rebuild_review_index(reviews):
+    add_pending("/a/b", "1.jpg", register=False)
+    add_pending("/c", "2.jpg", register=False)
+    os.makedirs(reviews / "approve" / "d")
+    (reviews / "approve" / "d" / "3.jpg").write_bytes(b"data")
+
+    assert review_index.rebuild_review_index() == 3
+    assert statuses() == {
+        ("/a/b", "1.jpg"): "pending",
+        ("/c", "2.jpg"): "pending",
+        ("/d", "3.jpg"): "approve",
+    }
@@ -0,0 +1,289 @@
+"""
+分片上传：prepare / chunk / batch / complete 与 merge_worker 合并（SQLite + 临时目录，离线运行）
+"""
+import errno
+import hashlib
+import io
+import os
+import sys
+
+import pytest
+from flask import Flask
+
+import merge_worker
+import routes.upload_chunk  # noqa: F401  routes/__init__ 会用蓝图对象覆盖同名属性
+from db import File, UploadSession, UploadPart
+
+upload_chunk = sys.modules["routes.upload_chunk"]
+
+CHUNK = 1000
+DATA = os.urandom(CHUNK * 4 + 321)
+TOTAL = 5
+
+
+class _FakeImmichApi:
+    """合并后的 Immich 扫描 / 入相册与本测试无关"""
+
+    def scan_external_library(self):
+        return True
+
+    def wait_asset_by_original_path(self, *args, **kwargs):
+        return "asset"
+
+    def put_assets_to_album(self, *args, **kwargs):
+        return True
+
+
+@pytest.fixture(params=["parts", "preallocate"])
+def storage_mode(request):
+    return request.param
+
+
+@pytest.fixture
+def client(sqlite_db, tmp_path, monkeypatch, storage_mode):
+    root = str(tmp_path / "immich")
+    monkeypatch.setattr(upload_chunk, "db", sqlite_db)
+    monkeypatch.setattr(upload_chunk, "IMMICH_EXTERNAL_HOST_ROOT", root)
+    monkeypatch.setattr(upload_chunk, "CHUNK_STORAGE_MODE", storage_mode)
+    monkeypatch.setattr(merge_worker, "IMMICH_EXTERNAL_HOST_ROOT", root)
+    monkeypatch.setattr(merge_worker, "IMMICHApi", _FakeImmichApi)
+
+    app = Flask(__name__)
+    app.register_blueprint(upload_chunk.bp)
+    client = app.test_client()
+    client.root = root
+    return client
+
+
+def prepare(client, fingerprint="fp", **overrides):
+    payload = {
+        "fingerprint": fingerprint,
+        "file_name": "video.mp4",
+        "file_size": len(DATA),
+        "chunk_size": CHUNK,
+        "total_chunks": TOTAL,
+    }
+    payload.update(overrides)
+    return client.post("/api/upload/prepare", json=payload)
+
+
+def part_bytes(n):
+    return DATA[(n - 1) * CHUNK: n * CHUNK]
+
+
+def send_part(client, n, data=None, fingerprint="fp"):
+    return client.post(
+        "/api/upload/chunk/complete",
+        data={
+            "fingerprint": fingerprint,
+            "part_number": str(n),
+            "file": (io.BytesIO(part_bytes(n) if data is None else data), "blob"),
+        },
+        content_type="multipart/form-data",
+    )
+
+
+def send_batch(client, numbers, fingerprint="fp"):
+    form = {"fingerprint": fingerprint}
+    for n in numbers:
+        form[f"part_{n}"] = (io.BytesIO(part_bytes(n)), "blob")
+    return client.post("/api/upload/chunk/batch", data=form, content_type="multipart/form-data")
+
+
+def merge(fingerprint="fp"):
+    session = UploadSession.select().join(File).where(File.fingerprint == fingerprint).get()
+    merge_worker.merge_one_session(session)
+    return UploadSession.get_by_id(session.id), File.get(File.fingerprint == fingerprint)
+
+
+def test_upload_out_of_order_and_merge(client, storage_mode):
+    assert prepare(client).json["data"]["status"] == "NEW"
+    if storage_mode == "preallocate":
+        partial = os.path.join(client.root, "fp_video.mp4.partial")
+        assert os.path.getsize(partial) == len(DATA)
+
+    for n in (3, 1, 5, 2):
+        body = send_part(client, n).json
+        assert body["success"] and not body["data"]["ready_to_merge"]
+
+    resumed = prepare(client).json["data"]
+    assert resumed["status"] == "PARTIAL"
+    assert resumed["uploaded_chunks"] == [1, 2, 3, 5]
+
+    body = send_part(client, 4).json
+    assert body["data"]["uploaded_chunks"] == TOTAL
+    assert body["data"]["ready_to_merge"]
+
+    assert client.post("/api/upload/complete", json={"fingerprint": "fp"}).json["data"]["status"] == "PENDING_MERGE"
+
+    session, file = merge()
+    assert session.status == "COMPLETED"
+    assert file.status == "COMPLETED"
+    with open(os.path.join(client.root, file.cos_key), "rb") as f:
+        assert f.read() == DATA
+    assert os.listdir(client.root) == [file.cos_key]
+
+
+def test_duplicate_part_counted_once(client):
+    prepare(client)
+    send_part(client, 1)
+    body = send_part(client, 1).json
+    assert body["data"]["uploaded_chunks"] == 1
+
+    part = UploadPart.get()
+    assert part.etag == hashlib.md5(part_bytes(1)).hexdigest()
+
+    incomplete = client.post("/api/upload/complete", json={"fingerprint": "fp"})
+    assert incomplete.status_code == 400
+    assert incomplete.json["data"]["uploaded_chunks"] == 1
+
+
+def test_chunk_streamed_without_tmp_leftovers(client, storage_mode):
+    prepare(client)
+    send_part(client, 2)
+    if storage_mode == "preallocate":
+        path, offset, leftover = os.path.join(client.root, "fp_video.mp4.partial"), CHUNK, "fp_video.mp4.partial"
+    else:
+        path, offset, leftover = upload_chunk.get_chunk_path("fp", 2), 0, "fp_2.part"
+    with open(path, "rb") as f:
+        f.seek(offset)
+        assert f.read(CHUNK) == part_bytes(2)
+    assert os.listdir(client.root) == [leftover]
+
+
+def test_upload_complete_reads_counter(client):
+    prepare(client)
+    # complete 只看原子累加的 uploaded_chunks，不再逐条统计 UploadPart
+    UploadSession.update(uploaded_chunks=TOTAL).execute()
+    assert client.post("/api/upload/complete", json={"fingerprint": "fp"}).json["data"]["status"] == "PENDING_MERGE"
+
+
+@pytest.mark.parametrize("n, data", [
+    (1, part_bytes(1)[:-1]),      # 非最后一片过短
+    (1, part_bytes(1) + b"x"),    # 超过 chunk_size
+    (TOTAL, part_bytes(TOTAL) + b"x"),  # 最后一片超出 file_size
+])
+def test_wrong_part_size_rejected(client, n, data):
+    prepare(client)
+    resp = send_part(client, n, data)
+    assert resp.status_code == 400
+    assert UploadPart.select().count() == 0
+    assert UploadSession.get().uploaded_chunks == 0
+
+
+def test_part_number_out_of_range(client):
+    prepare(client)
+    assert send_part(client, TOTAL + 1, b"x").status_code == 400
+
+
+def test_prepare_rejects_inconsistent_total_chunks(client):
+    assert prepare(client, total_chunks=TOTAL + 1).status_code == 400
+
+
+def test_prepare_chunk_size_change(client, storage_mode):
+    prepare(client)
+    resp = prepare(client, chunk_size=CHUNK * 2, total_chunks=3)
+    if storage_mode == "preallocate":
+        assert resp.status_code == 409
+        assert resp.json["data"]["chunk_size"] == CHUNK
+    else:
+        assert resp.status_code == 200
+        assert resp.json["data"]["chunk_size"] == CHUNK * 2
+
+
+def test_batch_upload(client):
+    prepare(client)
+    body = send_batch(client, [1, 2, 3]).json
+    assert body["data"]["parts"] == [1, 2, 3]
+    assert body["data"]["uploaded_chunks"] == 3
+
+    body = send_batch(client, [3, 4, 5]).json
+    assert body["data"]["uploaded_chunks"] == TOTAL
+    assert body["data"]["ready_to_merge"]
+
+    client.post("/api/upload/complete", json={"fingerprint": "fp"})
+    _, file = merge()
+    with open(os.path.join(client.root, file.cos_key), "rb") as f:
+        assert f.read() == DATA
+
+
+def test_batch_rejects_bad_fields(client):
+    prepare(client)
+    assert send_batch(client, []).status_code == 400
+    assert send_batch(client, [0]).status_code == 400
+    assert UploadPart.select().count() == 0
+
+
+def test_merge_rolls_back_on_wrong_size(client, storage_mode):
+    prepare(client)
+    send_batch(client, range(1, TOTAL + 1))
+    client.post("/api/upload/complete", json={"fingerprint": "fp"})
+
+    if storage_mode == "preallocate":
+        os.truncate(os.path.join(client.root, "fp_video.mp4.partial"), len(DATA) + 1)
+    else:
+        os.truncate(upload_chunk.get_chunk_path("fp", 2), CHUNK - 1)
+
+    session, file = merge()
+    assert session.status == "UPLOADING"
+    assert file.status != "COMPLETED"
+    assert not os.path.exists(os.path.join(client.root, file.cos_key))
+
+
+def test_reupload_after_merge_rollback_becomes_ready(client, storage_mode):
+    if storage_mode == "preallocate":
+        pytest.skip("预分配文件大小不符时重传分片无法修复")
+    prepare(client)
+    send_batch(client, range(1, TOTAL + 1))
+    client.post("/api/upload/complete", json={"fingerprint": "fp"})
+    os.truncate(upload_chunk.get_chunk_path("fp", 2), CHUNK - 1)
+    assert merge()[0].status == "UPLOADING"
+
+    # 分片记录已存在，重传不新增行，但状态仍要按计数重新进入待合并
+    body = send_part(client, 2).json
+    assert body["data"]["uploaded_chunks"] == TOTAL
+    assert body["data"]["ready_to_merge"]
+
+    session, file = merge()
+    assert session.status == "COMPLETED"
+    with open(os.path.join(client.root, file.cos_key), "rb") as f:
+        assert f.read() == DATA
+
+    # 已完成的会话不会被重传的分片拉回待合并
+    assert not send_part(client, 1).json["data"]["ready_to_merge"]
+    assert UploadSession.get().status == "COMPLETED"
+
+
+def test_merge_status_write_keeps_counter(client):
+    prepare(client)
+    send_batch(client, range(1, TOTAL))
+    UploadSession.update(status="READY_TO_COMPLETE").execute()
+    stale = UploadSession.get()
+
+    # 合并期间 chunk_complete 并发累加了计数
+    UploadSession.update(uploaded_chunks=TOTAL).execute()
+    merge_worker.merge_one_session(stale)
+
+    session = UploadSession.get()
+    assert session.status == "UPLOADING"
+    assert session.uploaded_chunks == TOTAL
+
+
+def test_copy_range_falls_back(tmp_path, monkeypatch):
+    src = tmp_path / "src"
+    dst = tmp_path / "dst"
+    src.write_bytes(DATA)
+
+    def unsupported(*args):
+        raise OSError(errno.EXDEV, "cross-device")
+
+    for method, disable in (("copy_file_range", "copy_file_range"), ("sendfile", "sendfile"), ("buffered", None)):
+        with open(src, "rb", buffering=0) as in_f, open(dst, "wb", buffering=0) as out_f:
+            assert merge_worker._copy_range(in_f.fileno(), out_f.fileno(), len(DATA)) == method
+        assert dst.read_bytes() == DATA
+        if disable:
+            monkeypatch.setattr(os, disable, unsupported)
+
+    with open(src, "rb", buffering=0) as in_f, open(dst, "wb", buffering=0) as out_f:
+        with pytest.raises(IOError):
+            merge_worker._copy_range(in_f.fileno(), out_f.fileno(), len(DATA) + 1)
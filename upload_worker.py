@@ -6,6 +6,8 @@ from apis.immich_api import IMMICHApi
 from config import IMMICH_TARGET_ALBUM_ID, TZ
 from db import UploadTask, UploadRecord
 from utils.logger import log_line
+from utils.media_probe import probe_dimensions, make_thumbnail
+from utils.storage import get_image_url
 
 MAX_RETRY = 3
 FAILED_DIR = "storage/failed_uploads"
@@ -16,6 +18,29 @@ def ensure_failed_dir():
         os.makedirs(FAILED_DIR, exist_ok=True)
 
 
+def probe_media(task):
+    """
+    入库前探测媒体尺寸并生成缩略图
+
+    :param task: UploadTask
+    :returns: (width, height, thumb_url)；失败时为 (0, 0, None)
+    """
+    width, height, thumb = 0, 0, None
+    try:
+        width, height = probe_dimensions(task.tmp_path)
+    except Exception as e:
+        log_line(f"[ERROR] 读取媒体尺寸失败: id={task.id}, {e}")
+
+    try:
+        thumb_id = make_thumbnail(task.tmp_path, f"thumb_{task.fingerprint or task.etag or task.id}")
+        if thumb_id:
+            thumb = get_image_url(thumb_id, "gallery_cache")
+    except Exception as e:
+        log_line(f"[ERROR] 生成缩略图失败: id={task.id}, {e}")
+
+    return width, height, thumb
+
+
 def task_worker():
     """
     后台异步任务：
@@ -72,6 +97,9 @@ def task_worker():
 
             log_line(f"[INFO] 文件已在 External Library: {task.tmp_path}")
 
+            # 趁文件还在 page cache 中，只读文件头取尺寸并生成缩略图；失败不影响上传
+            width, height, thumb = probe_media(task)
+
             ok = immich_api.upload_file_to_album(file_path=task.tmp_path, album_id=IMMICH_TARGET_ALBUM_ID)
             if not ok:
                 raise RuntimeError("添加资源到相册失败")
@@ -119,12 +147,12 @@ def task_worker():
                     file_size=os.path.getsize(task.tmp_path),
                     upload_time=datetime.now(TZ),
                     original_filename=task.original_filename,
-                    width=0,
-                    height=0,
+                    width=width,
+                    height=height,
                     etag=task.etag,
                     fingerprint=task.fingerprint,
                     device_model=task.device,
-                    thumb=None,
+                    thumb=thumb,
                     # 如果后面给 UploadRecord 加 asset_id 字段，可以写进去
                     # asset_id=asset_id,
                 )
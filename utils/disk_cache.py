@@ -0,0 +1,70 @@
+import os
+import threading
+import time
+
+from utils.logger import log_line
+
+_last_evict = {}
+_lock = threading.Lock()
+
+
+def touch(path: str) -> None:
+    """刷新文件访问时间，供 LRU 淘汰使用（部分挂载点为 noatime，读取不会更新 atime）"""
+    try:
+        os.utime(path, None)
+    except OSError:
+        pass
+
+
+def evict_lru(directory: str, max_bytes: int, min_interval: float = 0.0) -> int:
+    """
+    按最近访问时间淘汰目录下的文件，直到总大小不超过 max_bytes
+
+    :param directory: 缓存目录（只处理第一层文件）
+    :param max_bytes: 总大小上限（字节），<=0 表示不限制
+    :param min_interval: 同一目录两次扫描的最小间隔秒数，避免每次写入都全量扫描
+    :returns: 删除的文件数
+    """
+    if max_bytes <= 0 or not os.path.isdir(directory):
+        return 0
+
+    now = time.time()
+    with _lock:
+        if min_interval and now - _last_evict.get(directory, 0) < min_interval:
+            return 0
+        _last_evict[directory] = now
+
+    entries = []
+    total = 0
+    with os.scandir(directory) as it:
+        for entry in it:
+            if not entry.is_file(follow_symlinks=False):
+                continue
+            try:
+                st = entry.stat(follow_symlinks=False)
+            except FileNotFoundError:
+                continue
+            entries.append((max(st.st_atime, st.st_mtime), st.st_size, entry.path))
+            total += st.st_size
+
+    if total <= max_bytes:
+        return 0
+
+    removed = 0
+    entries.sort()
+    for _, size, path in entries:
+        if total <= max_bytes:
+            break
+        try:
+            os.remove(path)
+            total -= size
+            removed += 1
+        except FileNotFoundError:
+            total -= size
+        except OSError as e:
+            log_line(f"[ERROR] 缓存淘汰失败: {path} -> {e}")
+
+    if removed:
+        log_line(f"[INFO] 缓存淘汰: dir={directory}, removed={removed}")
+    return removed
+
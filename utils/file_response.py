@@ -0,0 +1,117 @@
+import hashlib
+import mimetypes
+import os
+import time
+from typing import Optional
+from urllib.parse import quote
+
+from flask import make_response, request, send_file
+from werkzeug.http import http_date
+
+from config import FILE_SERVING_MODE, X_ACCEL_LOCATIONS
+
+_ACCEL_ROOTS = [
+    (os.path.realpath(root), prefix.rstrip("/"))
+    for root, prefix in X_ACCEL_LOCATIONS.items()
+]
+
+
+def _accel_uri(path: str) -> Optional[str]:
+    """把本地文件路径映射为 nginx internal location 下的 URI，不在映射目录内返回 None"""
+    real = os.path.realpath(path)
+    for root, prefix in _ACCEL_ROOTS:
+        if os.path.commonpath([real, root]) == root:
+            rel = os.path.relpath(real, root).replace(os.sep, "/")
+            return f"{prefix}/{quote(rel)}"
+    return None
+
+
+def file_etag(stat: os.stat_result) -> str:
+    """磁盘文件的 ETag：md5(f"{mtime}-{size}")，内存结果缓存也按写好的文件计算，两条路径一致"""
+    return hashlib.md5(f"{stat.st_mtime}-{stat.st_size}".encode()).hexdigest()
+
+
+def _cache_headers(etag: str, mtime: float, max_age: Optional[int]) -> dict:
+    headers = {
+        "ETag": etag,
+        "Last-Modified": http_date(mtime),
+        "Cache-Control": f"public, max-age={max_age}" if max_age is not None else "no-cache",
+    }
+    if max_age is not None:
+        headers["Expires"] = http_date(time.time() + max_age)
+    return headers
+
+
+def _not_modified(headers: dict) -> bool:
+    return (request.headers.get("If-None-Match") == headers["ETag"]
+            or request.headers.get("If-Modified-Since") == headers["Last-Modified"])
+
+
+def send_file_cached(path: str,
+                     mimetype: Optional[str] = None,
+                     stat: Optional[os.stat_result] = None,
+                     max_age: Optional[int] = None,
+                     as_attachment: bool = False):
+    """
+    带条件请求处理的文件响应
+
+    ETag / Last-Modified 与 304 判断始终在 Python 中完成；文件字节按 FILE_SERVING_MODE 由 Flask
+    或 nginx（X-Accel-Redirect）发送，Range 请求分别由 werkzeug / nginx 处理。nginx 侧示例
+    （关闭 nginx 自己的 ETag，沿用上游响应里的头）：
+
+        location /_protected/storage/ {
+            internal;
+            alias /root/ZYT_AutoFM/storage/;
+            etag off;
+        }
+
+    :param path: 文件路径
+    :param mimetype: Content-Type，为空时按扩展名推断
+    :param stat: 已有的 os.stat 结果，避免重复 stat
+    :param max_age: 缓存秒数；None 表示 no-cache（每次协商）
+    :param as_attachment: 是否作为附件下载
+    :returns: Flask Response
+    """
+    stat = stat or os.stat(path)
+    etag = file_etag(stat)
+    headers = _cache_headers(etag, stat.st_mtime, max_age)
+
+    # 缓存检查
+    if _not_modified(headers):
+        resp = make_response("", 304)
+        resp.headers.update(headers)
+        return resp
+
+    mimetype = mimetype or mimetypes.guess_type(path)[0] or "application/octet-stream"
+    uri = _accel_uri(path) if FILE_SERVING_MODE == "x-accel" else None
+    if uri:
+        resp = make_response("", 200)
+        resp.headers["X-Accel-Redirect"] = uri
+        resp.headers["Content-Type"] = mimetype
+        if as_attachment:
+            resp.headers["Content-Disposition"] = f"attachment; filename*=UTF-8''{quote(os.path.basename(path))}"
+    else:
+        # conditional=True：由 werkzeug 处理 Range / If-Range（206），304 已在上面判断过
+        resp = make_response(send_file(os.path.abspath(path), mimetype=mimetype, as_attachment=as_attachment, etag=etag,
+                                       last_modified=stat.st_mtime, conditional=True))
+    resp.headers.update(headers)
+    return resp
+
+
+def send_bytes_cached(data: bytes, etag: str, mtime: float, mimetype: str, max_age: Optional[int] = None):
+    """
+    带条件请求处理的内存字节响应，头部与 send_file_cached 一致
+
+    :param data: 响应体
+    :param etag: ETag
+    :param mtime: 作为 Last-Modified 的时间戳
+    :param mimetype: Content-Type
+    :param max_age: 缓存秒数；None 表示 no-cache
+    :returns: Flask Response
+    """
+    headers = _cache_headers(etag, mtime, max_age)
+    resp = make_response("", 304) if _not_modified(headers) else make_response(data)
+    resp.headers.update(headers)
+    if resp.status_code == 200:
+        resp.headers["Content-Type"] = mimetype
+    return resp
@@ -0,0 +1,152 @@
+import bisect
+import os
+import threading
+import time
+from typing import Dict, List, Optional, Tuple
+
+from config import IMAGE_INDEX_POLL_SECONDS
+
+
+class AmbiguousImageId(LookupError):
+    """image_id 作为前缀匹配到多个文件"""
+
+    def __init__(self, image_id: str, candidates: List[str]):
+        super().__init__(f"image_id 不唯一: {image_id}")
+        self.image_id = image_id
+        self.candidates = candidates
+
+
+class ImageIndex:
+    """
+    单个目录的文件名索引（进程内）
+
+    - 首次查询时用 os.scandir 懒加载；
+    - 精确匹配（去掉扩展名的文件名）走 dict，O(1)；
+    - 前缀匹配在有序文件名列表上二分查找，兼容原有 startswith 语义；
+    - 目录 mtime 轮询保持新鲜：未命中或距上次检查超过 poll_seconds 时 stat 目录，有变化则重建；
+    - 本进程写入的新文件可通过 add() 直接登记，无需等待重建。
+    """
+
+    def __init__(self, directory: str, poll_seconds: float = IMAGE_INDEX_POLL_SECONDS):
+        self.directory = directory
+        self.poll_seconds = poll_seconds
+        self._lock = threading.Lock()
+        self._by_stem: Dict[str, str] = {}
+        self._names: List[str] = []
+        self._dir_mtime: Optional[float] = None
+        self._checked_at = 0.0
+
+    # ---------- 维护 ----------
+
+    @staticmethod
+    def _indexable(name: str) -> bool:
+        # 跳过隐藏文件和原子写入用的临时文件
+        return not name.startswith(".") and not name.endswith(".tmp")
+
+    def _dir_changed(self) -> bool:
+        try:
+            mtime = os.stat(self.directory).st_mtime
+        except FileNotFoundError:
+            mtime = None
+        self._checked_at = time.monotonic()
+        return mtime != self._dir_mtime
+
+    def _rebuild(self) -> None:
+        by_stem = {}
+        names = []
+        try:
+            self._dir_mtime = os.stat(self.directory).st_mtime
+            with os.scandir(self.directory) as it:
+                for entry in it:
+                    if self._indexable(entry.name) and entry.is_file():
+                        names.append(entry.name)
+                        by_stem.setdefault(os.path.splitext(entry.name)[0], entry.name)
+        except FileNotFoundError:
+            self._dir_mtime = None
+        names.sort()
+        self._by_stem = by_stem
+        self._names = names
+        self._checked_at = time.monotonic()
+
+    def add(self, filename: str) -> None:
+        """登记本进程新写入的文件（只传文件名，不含目录）"""
+        if not self._indexable(filename):
+            return
+        with self._lock:
+            if self._dir_mtime is None and not self._names:
+                # 尚未加载，留给首次查询统一扫描
+                return
+            i = bisect.bisect_left(self._names, filename)
+            if i == len(self._names) or self._names[i] != filename:
+                self._names.insert(i, filename)
+            self._by_stem.setdefault(os.path.splitext(filename)[0], filename)
+
+    def discard(self, filename: str) -> None:
+        """移除已删除的文件"""
+        with self._lock:
+            i = bisect.bisect_left(self._names, filename)
+            if i < len(self._names) and self._names[i] == filename:
+                del self._names[i]
+            stem = os.path.splitext(filename)[0]
+            if self._by_stem.get(stem) == filename:
+                del self._by_stem[stem]
+
+    # ---------- 查询 ----------
+
+    def _match(self, image_id: str) -> Optional[str]:
+        exact = self._by_stem.get(image_id)
+        if exact:
+            return exact
+
+        i = bisect.bisect_left(self._names, image_id)
+        candidates = []
+        while i < len(self._names) and self._names[i].startswith(image_id) and len(candidates) < 10:
+            candidates.append(self._names[i])
+            i += 1
+        if len(candidates) > 1:
+            raise AmbiguousImageId(image_id, candidates)
+        return candidates[0] if candidates else None
+
+    def lookup(self, image_id: str) -> Optional[Tuple[str, os.stat_result]]:
+        """
+        按 image_id 查找文件
+
+        :param image_id: 文件名（可不带扩展名）或唯一前缀
+        :returns: (文件路径, stat)；不存在返回 None
+        :raises AmbiguousImageId: 前缀匹配到多个文件且没有精确匹配
+        """
+        with self._lock:
+            if self._dir_mtime is None and not self._names:
+                self._rebuild()
+            elif time.monotonic() - self._checked_at > self.poll_seconds and self._dir_changed():
+                self._rebuild()
+
+            name = self._match(image_id)
+            if name is None and self._dir_changed():
+                # 其他 worker 刚写入的文件
+                self._rebuild()
+                name = self._match(image_id)
+
+        if name is None:
+            return None
+
+        path = os.path.join(self.directory, name)
+        try:
+            return path, os.stat(path)
+        except FileNotFoundError:
+            self.discard(name)
+            return None
+
+
+_indexes: Dict[str, ImageIndex] = {}
+_indexes_lock = threading.Lock()
+
+
+def get_image_index(directory: str) -> ImageIndex:
+    """获取目录对应的进程内索引（按绝对路径复用）"""
+    key = os.path.abspath(directory)
+    with _indexes_lock:
+        index = _indexes.get(key)
+        if index is None:
+            index = _indexes[key] = ImageIndex(key)
+        return index
@@ -0,0 +1,126 @@
+import hashlib
+import io
+import os
+from typing import Optional, Tuple
+from uuid import uuid4
+
+import cv2
+import numpy as np
+from PIL import Image, ImageOps
+
+from config import GALLERY_CACHE_DIR, GALLERY_CACHE_MAX_BYTES, IMAGE_VARIANT_QUALITY, IMAGE_VARIANT_WIDTHS
+from tasks.watermark_task import encode_jpeg
+from utils.disk_cache import evict_lru, touch
+
+VARIANT_DIR = os.path.join(GALLERY_CACHE_DIR, "variants")
+
+VARIANT_FORMATS = {
+    "jpg": ("jpg", "image/jpeg"),
+    "jpeg": ("jpg", "image/jpeg"),
+    "webp": ("webp", "image/webp"),
+}
+
+
+def parse_variant_params(width: Optional[str], fmt: Optional[str]) -> Tuple[Optional[int], Optional[str]]:
+    """
+    解析并规范化 ?w=&fmt= 参数
+
+    :param width: 请求宽度字符串
+    :param fmt: 请求格式字符串（jpg / jpeg / webp）
+    :returns: (档位宽度, 规范化格式)；都为 None 表示请求原图
+    :raises ValueError: 参数非法
+    """
+    w = None
+    if width:
+        try:
+            w = int(width)
+        except ValueError:
+            w = 0
+        if w <= 0:
+            raise ValueError("w 必须为正整数")
+        # 向上取整到档位，超过最大档按最大档
+        w = next((x for x in IMAGE_VARIANT_WIDTHS if x >= w), IMAGE_VARIANT_WIDTHS[-1])
+
+    f = None
+    if fmt:
+        f = fmt.lower()
+        if f not in VARIANT_FORMATS:
+            raise ValueError(f"不支持的格式: {fmt}")
+        f = VARIANT_FORMATS[f][0]
+
+    return w, f
+
+
+def variant_mimetype(fmt: str) -> str:
+    return VARIANT_FORMATS[fmt][1]
+
+
+def render_variant(src_path: str, width: Optional[int], fmt: str, quality: int = IMAGE_VARIANT_QUALITY) -> bytes:
+    """
+    解码原图并生成指定宽度 / 格式的字节
+
+    JPEG 用 draft 按 DCT 缩放解码，只解出不小于目标尺寸的像素；不放大。
+
+    :param src_path: 原图路径
+    :param width: 目标宽度，None 表示保持原宽
+    :param fmt: 输出格式 jpg / webp
+    :param quality: 编码质量
+    :returns: 编码后的字节
+    :raises PIL.UnidentifiedImageError: 不是图片
+    """
+    with Image.open(src_path) as im:
+        if width:
+            # 宽高都不小于 width，EXIF 旋转后宽度依然够用
+            im.draft("RGB", (width, width))
+        im = ImageOps.exif_transpose(im)
+        src = np.asarray(im.convert("RGB"))
+
+    h, w = src.shape[:2]
+    if width and w > width:
+        new_h = max(1, round(h * width / w))
+        src = cv2.resize(src, (width, new_h), interpolation=cv2.INTER_AREA)
+
+    if fmt == "jpg":
+        return encode_jpeg(src, quality)
+
+    buf = io.BytesIO()
+    Image.fromarray(src).save(buf, "WEBP", quality=quality, method=4)
+    return buf.getvalue()
+
+
+def get_variant(src_path: str, stat: os.stat_result, width: Optional[int], fmt: Optional[str]) -> str:
+    """
+    获取（必要时生成）图片变体的缓存文件路径
+
+    缓存键包含原图路径、mtime 与大小，原图被覆盖后自动失效。
+
+    :param src_path: 原图路径
+    :param stat: 原图 os.stat 结果
+    :param width: 档位宽度
+    :param fmt: 输出格式，None 表示 jpg
+    :returns: 缓存文件路径
+    """
+    fmt = fmt or "jpg"
+    key = hashlib.sha1(
+        f"{os.path.realpath(src_path)}|{stat.st_mtime_ns}|{stat.st_size}".encode()
+    ).hexdigest()[:24]
+    path = os.path.join(VARIANT_DIR, f"{key}_w{width or 0}.{fmt}")
+
+    if os.path.exists(path):
+        touch(path)
+        return path
+
+    data = render_variant(src_path, width, fmt)
+
+    os.makedirs(VARIANT_DIR, exist_ok=True)
+    tmp_path = f"{path}.{uuid4().hex}.tmp"
+    try:
+        with open(tmp_path, "wb") as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+
+    evict_lru(VARIANT_DIR, GALLERY_CACHE_MAX_BYTES, min_interval=60)
+    return path
@@ -0,0 +1,195 @@
+import os
+import shutil
+import struct
+from typing import Dict, List, Optional, Tuple
+from uuid import uuid4
+
+from PIL import Image
+
+TAG_DATETIME = 0x0132
+TAG_EXIF_IFD = 0x8769
+TAG_DATETIME_ORIGINAL = 0x9003
+TAG_DATETIME_DIGITIZED = 0x9004
+
+DATETIME_TAGS = (TAG_DATETIME, TAG_DATETIME_ORIGINAL, TAG_DATETIME_DIGITIZED)
+
+_TYPE_ASCII = 2
+# APP1 段最大 64KB，读这么多足以覆盖 SOI 之后的 APP0/APP1
+_HEAD_READ_BYTES = 128 * 1024
+
+
+def _iter_segments(data: bytes):
+    """
+    遍历 JPEG 头部的 marker 段，遇到 SOS 或数据不足时停止
+
+    :returns: 迭代 (marker, 段起始偏移, 段总长度（含 FFxx 与长度字段）)
+    """
+    pos = 2
+    while pos + 4 <= len(data):
+        if data[pos] != 0xFF:
+            return
+        marker = data[pos + 1]
+        if marker == 0xFF:
+            # 填充字节
+            pos += 1
+            continue
+        if marker == 0xDA:  # SOS：之后是压缩数据
+            return
+        length = struct.unpack(">H", data[pos + 2:pos + 4])[0]
+        yield marker, pos, length + 2
+        pos += length + 2
+
+
+def find_exif_segment(data: bytes) -> Optional[Tuple[int, int]]:
+    """
+    :param data: 文件头部字节（从 SOI 开始）
+    :returns: (APP1 段起始偏移, 段总长度)；没有 Exif APP1 返回 None
+    """
+    for marker, offset, size in _iter_segments(data):
+        if marker == 0xE1 and data[offset + 4:offset + 10] == b"Exif\x00\x00":
+            return offset, size
+    return None
+
+
+def _ascii_tag_offsets(data: bytes, tiff_start: int, tiff_end: int) -> Dict[int, Tuple[int, int]]:
+    """
+    解析 IFD0 与 Exif IFD，返回时间类 ASCII 标签值在文件中的绝对偏移
+
+    :returns: {tag: (绝对偏移, count)}
+    """
+    order = data[tiff_start:tiff_start + 2]
+    if order == b"II":
+        endian = "<"
+    elif order == b"MM":
+        endian = ">"
+    else:
+        raise ValueError("无效的 TIFF 字节序")
+
+    def read_ifd(ifd_offset: int) -> List[Tuple[int, int, int, int]]:
+        base = tiff_start + ifd_offset
+        if base + 2 > tiff_end:
+            raise ValueError("IFD 偏移越界")
+        count = struct.unpack(endian + "H", data[base:base + 2])[0]
+        entries = []
+        for i in range(count):
+            p = base + 2 + i * 12
+            if p + 12 > tiff_end:
+                raise ValueError("IFD 条目越界")
+            tag, typ, cnt = struct.unpack(endian + "HHI", data[p:p + 8])
+            entries.append((tag, typ, cnt, p + 8))
+        return entries
+
+    ifd0_offset = struct.unpack(endian + "I", data[tiff_start + 4:tiff_start + 8])[0]
+    entries = read_ifd(ifd0_offset)
+    for tag, typ, cnt, value_pos in list(entries):
+        if tag == TAG_EXIF_IFD:
+            exif_ifd = struct.unpack(endian + "I", data[value_pos:value_pos + 4])[0]
+            entries.extend(read_ifd(exif_ifd))
+
+    result = {}
+    for tag, typ, cnt, value_pos in entries:
+        if tag not in DATETIME_TAGS or typ != _TYPE_ASCII:
+            continue
+        if cnt <= 4:
+            # 值内联在条目中，放不下 19 位时间字符串
+            continue
+        abs_offset = tiff_start + struct.unpack(endian + "I", data[value_pos:value_pos + 4])[0]
+        if abs_offset + cnt > tiff_end:
+            raise ValueError("标签值越界")
+        result[tag] = (abs_offset, cnt)
+    return result
+
+
+def patch_exif_datetime_in_place(image_path: str, value: str) -> bool:
+    """
+    原地覆盖 EXIF 中 DateTime / DateTimeOriginal / DateTimeDigitized 的字符串值
+
+    只读文件头部解析 APP1 / TIFF IFD，然后用 r+b 直接写入这三个值所在的字节，
+    文件大小与其余内容完全不变。
+
+    :param image_path: JPEG 路径
+    :param value: "YYYY:MM:DD HH:MM:SS"
+    :returns: 三个标签都存在且长度足够并已写入时返回 True；否则不做任何修改并返回 False
+    """
+    encoded = value.encode("ascii")
+    with open(image_path, "r+b") as f:
+        head = f.read(_HEAD_READ_BYTES)
+        if head[:2] != b"\xff\xd8":
+            return False
+
+        seg = find_exif_segment(head)
+        if seg is None:
+            return False
+        seg_offset, seg_size = seg
+        tiff_start = seg_offset + 10
+        tiff_end = min(seg_offset + seg_size, len(head))
+
+        try:
+            offsets = _ascii_tag_offsets(head, tiff_start, tiff_end)
+        except (ValueError, struct.error):
+            return False
+
+        if set(offsets) != set(DATETIME_TAGS) or any(cnt < len(encoded) + 1 for _, cnt in offsets.values()):
+            return False
+
+        for abs_offset, cnt in offsets.values():
+            f.seek(abs_offset)
+            f.write(encoded.ljust(cnt, b"\x00"))
+    return True
+
+
+def rewrite_exif_datetime_segment(image_path: str, value: str) -> bool:
+    """
+    只重建 APP1(Exif) 段：用 Pillow 解析现有 EXIF（不解码像素）并写入三个时间标签，
+    其余段与压缩数据原样流式拷贝
+
+    :param image_path: JPEG 路径
+    :param value: "YYYY:MM:DD HH:MM:SS"
+    :returns: 成功返回 True；不是 JPEG 时返回 False
+    """
+    with open(image_path, "rb") as f:
+        head = f.read(_HEAD_READ_BYTES)
+    if head[:2] != b"\xff\xd8":
+        return False
+
+    with Image.open(image_path) as img:
+        exif = img.getexif()
+    exif[TAG_DATETIME] = value
+    exif_ifd = exif.get_ifd(TAG_EXIF_IFD)
+    exif_ifd[TAG_DATETIME_ORIGINAL] = value
+    exif_ifd[TAG_DATETIME_DIGITIZED] = value
+    # 原本没有 Exif IFD 时需要在 IFD0 中挂上指针，tobytes 才会序列化它
+    exif[TAG_EXIF_IFD] = exif_ifd
+    payload = exif.tobytes()
+    if len(payload) + 2 > 0xFFFF:
+        raise ValueError("EXIF 数据超过 APP1 段上限")
+    app1 = b"\xff\xe1" + struct.pack(">H", len(payload) + 2) + payload
+
+    # 新 APP1 放在 SOI（以及紧随其后的 APP0/JFIF）之后，旧的 Exif APP1 丢弃
+    seg = find_exif_segment(head)
+    insert_at = 2
+    for marker, offset, size in _iter_segments(head):
+        if marker == 0xE0 and offset == insert_at:
+            insert_at = offset + size
+        break
+
+    tmp_path = f"{image_path}.{uuid4().hex}.tmp"
+    try:
+        with open(image_path, "rb") as src, open(tmp_path, "wb") as dst:
+            if seg:
+                # insert_at 只会越过位于 SOI 之后的 APP0，旧 Exif 段一定不在它之前
+                dst.write(head[:insert_at])
+                dst.write(app1)
+                dst.write(head[insert_at:seg[0]])
+                src.seek(seg[0] + seg[1])
+            else:
+                dst.write(head[:insert_at])
+                dst.write(app1)
+                src.seek(insert_at)
+            shutil.copyfileobj(src, dst, 1024 * 1024)
+        shutil.copystat(image_path, tmp_path)
+        os.replace(tmp_path, image_path)
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+    return True
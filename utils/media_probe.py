@@ -0,0 +1,117 @@
+import os
+import struct
+from typing import Optional, Tuple
+
+import cv2
+from PIL import Image
+
+from config import GALLERY_CACHE_DIR, UPLOAD_THUMB_WIDTH, IMAGE_VARIANT_QUALITY
+from tasks.watermark_task import encode_jpeg
+from utils.image_variant import render_variant
+from utils.mp4_atoms import find_boxes
+
+VIDEO_EXTS = {".mp4", ".mov", ".m4v", ".3gp"}
+
+
+# =========================
+# MP4 / MOV 尺寸
+# =========================
+
+def _tkhd_dimensions(f, offset: int, header_size: int) -> Tuple[int, int, int]:
+    """读取 tkhd 中的宽高（16.16 定点）与旋转角度"""
+    f.seek(offset + header_size)
+    version = f.read(1)[0]
+    # version(1) + flags(3) + 时间/ID 字段 + reserved(8) + layer/group/volume/reserved(8)
+    body_offset = 4 + (32 if version == 1 else 20) + 8 + 8
+    f.seek(offset + header_size + body_offset)
+    matrix = struct.unpack(">9i", f.read(36))
+    width, height = struct.unpack(">II", f.read(8))
+
+    a, b = matrix[0], matrix[1]
+    rotation = 0
+    if a == 0 and b > 0:
+        rotation = 90
+    elif a == 0 and b < 0:
+        rotation = 270
+    elif a < 0:
+        rotation = 180
+    return width >> 16, height >> 16, rotation
+
+
+def probe_mp4_dimensions(path: str) -> Optional[Tuple[int, int]]:
+    """
+    只解析 moov/trak/tkhd 获取视频显示宽高（已考虑旋转矩阵）
+
+    :param path: 视频路径
+    :returns: (宽, 高)；不是 MP4/MOV 或没有视频轨时返回 None
+    """
+    size = os.path.getsize(path)
+    with open(path, "rb") as f:
+        for offset, header_size, _ in find_boxes(f, 0, size, (b"moov", b"trak", b"tkhd")):
+            w, h, rotation = _tkhd_dimensions(f, offset, header_size)
+            if w and h:
+                return (h, w) if rotation in (90, 270) else (w, h)
+    return None
+
+
+# =========================
+# 入库探测
+# =========================
+
+def probe_dimensions(path: str) -> Tuple[int, int]:
+    """
+    只读文件头获取媒体显示宽高，不做完整解码
+
+    :param path: 图片或视频路径
+    :returns: (宽, 高)；无法识别时返回 (0, 0)
+    """
+    if os.path.splitext(path)[1].lower() in VIDEO_EXTS:
+        return probe_mp4_dimensions(path) or (0, 0)
+
+    with Image.open(path) as im:
+        w, h = im.size
+        # EXIF Orientation 5-8 表示需要旋转 90/270 度
+        if im.getexif().get(0x0112, 1) in (5, 6, 7, 8):
+            w, h = h, w
+    return w, h
+
+
+def _video_thumb_bytes(path: str, width: int) -> Optional[bytes]:
+    """取视频第一帧生成缩略图"""
+    cap = cv2.VideoCapture(path)
+    try:
+        ok, frame = cap.read()
+    finally:
+        cap.release()
+    if not ok:
+        return None
+
+    h, w = frame.shape[:2]
+    if w > width:
+        frame = cv2.resize(frame, (width, max(1, round(h * width / w))), interpolation=cv2.INTER_AREA)
+    return encode_jpeg(cv2.cvtColor(frame, cv2.COLOR_BGR2RGB), IMAGE_VARIANT_QUALITY)
+
+
+def make_thumbnail(path: str, thumb_id: str, width: int = UPLOAD_THUMB_WIDTH) -> Optional[str]:
+    """
+    生成缩略图并写入 GALLERY_CACHE_DIR/<thumb_id>.jpg
+
+    :param path: 原文件路径
+    :param thumb_id: 缩略图 ID（不含扩展名）
+    :param width: 缩略图宽度
+    :returns: 缩略图 ID；无法生成时返回 None
+    """
+    if os.path.splitext(path)[1].lower() in VIDEO_EXTS:
+        data = _video_thumb_bytes(path, width)
+    else:
+        data = render_variant(path, width, "jpg")
+    if not data:
+        return None
+
+    os.makedirs(GALLERY_CACHE_DIR, exist_ok=True)
+    thumb_path = os.path.join(GALLERY_CACHE_DIR, f"{thumb_id}.jpg")
+    tmp_path = f"{thumb_path}.tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(data)
+    os.replace(tmp_path, thumb_path)
+    return thumb_id
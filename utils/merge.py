@@ -1,8 +1,59 @@
+import io
+
 import cv2
 import numpy as np
 from PIL import Image
 
 
+def _open_source(src):
+    """图片来源可以是路径，也可以是已在内存中的编码字节"""
+    return Image.open(src if isinstance(src, str) else io.BytesIO(src))
+
+
+def _plan_grid_layout(sizes, target_width: int, padding: int):
+    """
+    只根据图片尺寸规划网格布局（不解码像素）
+
+    行列数为 ceil(sqrt(n)) 列；每行按宽高比等高排列，行宽超出 target_width 时整行横向压缩，
+    不足时居中。
+
+    :param sizes: [(宽, 高), ...]
+    :param target_width: 最终合成图片宽度
+    :param padding: 图片间距像素
+    :returns: (cells, total_h)，cells 为与 sizes 顺序一致的 (x, y, w, h) 列表
+    """
+    n = len(sizes)
+    cols = int(np.ceil(np.sqrt(n)))
+    rows = int(np.ceil(n / cols))
+
+    cells = []
+    y = 0
+    idx = 0
+    for _ in range(rows):
+        row_sizes = sizes[idx: idx + min(cols, n - idx)]
+        idx += len(row_sizes)
+
+        ratios = [w / h for w, h in row_sizes]
+        row_h = int(target_width / sum(ratios))
+        widths = [int(row_h * r) for r in ratios]
+        row_w = sum(widths) + padding * (len(widths) - 1)
+
+        # 行宽超出目标宽度时整行（含间距）横向压缩；否则居中
+        fx = target_width / row_w if row_w > target_width else 1.0
+        offset = 0 if row_w > target_width else (target_width - row_w) // 2
+
+        x = 0
+        for w in widths:
+            left = offset + int(round(x * fx))
+            right = offset + int(round((x + w) * fx))
+            cells.append((left, y, right - left, row_h))
+            x += w + padding
+
+        y += row_h + padding
+
+    return cells, y - padding
+
+
 def merge_images_grid(image_paths,
                             target_width: int = 1500,
                             padding: int = 4,
@@ -10,68 +61,39 @@ def merge_images_grid(image_paths,
     """
     使用 numpy + OpenCV 进行高性能多图拼接，生成自适应网格布局
 
-    :param image_paths: 图片路径列表
+    先只读文件头规划布局，再逐张按目标格子尺寸 draft 解码、INTER_AREA 缩放后直接写入
+    预分配的画布，写完立即释放源图；峰值内存约为「一张源图 + 输出画布」。
+
+    :param image_paths: 图片路径或 JPEG 字节列表
     :param target_width: 最终合成图片宽度
     :param padding: 图片间距像素
     :param bg_color: 背景颜色 (R, G, B)
     :returns: 已合成的 PIL.Image 对象
     :raises keyError: 不涉及字典访问，不会抛出 keyError
     """
-    pil_images = [Image.open(p).convert("RGB") for p in image_paths]
-    imgs = [np.array(img) for img in pil_images]
-    n = len(imgs)
+    n = len(image_paths)
     if n == 0:
         raise ValueError("No images provided")
 
-    cols = int(np.ceil(np.sqrt(n)))
-    rows = int(np.ceil(n / cols))
-
-    groups = []
-    idx = 0
-    for _ in range(rows):
-        remain = n - idx
-        count = min(cols, remain)
-        groups.append(imgs[idx: idx + count])
-        idx += count
+    sizes = []
+    for p in image_paths:
+        with _open_source(p) as im:
+            sizes.append(im.size)
 
-    resized_rows = []
-    total_h = 0
-
-    for row_imgs in groups:
-        ratios = [img.shape[1] / img.shape[0] for img in row_imgs]
-        total_ratio = sum(ratios)
-        row_h = int(target_width / total_ratio)
-
-        scaled_row = []
-        for img, r in zip(row_imgs, ratios):
-            new_w = int(row_h * r)
-            resized = cv2.resize(img, (new_w, row_h))
-            scaled_row.append(resized)
-
-        row_w = sum(im.shape[1] for im in scaled_row) + padding * (len(scaled_row) - 1)
-        row_canvas = np.full((row_h, row_w, 3), bg_color, dtype=np.uint8)
-
-        x = 0
-        for im in scaled_row:
-            h, w = im.shape[0], im.shape[1]
-            row_canvas[0:h, x: x + w] = im
-            x += w + padding
+    cells, total_h = _plan_grid_layout(sizes, target_width, padding)
+    canvas = np.full((total_h, target_width, 3), bg_color, dtype=np.uint8)
 
-        resized_rows.append(row_canvas)
-        total_h += row_h + padding
+    for p, (x, y, w, h) in zip(image_paths, cells):
+        if w <= 0 or h <= 0:
+            continue
 
-    total_h -= padding
-    canvas = np.full((total_h, target_width, 3), bg_color, dtype=np.uint8)
+        with _open_source(p) as im:
+            # JPEG 解码时直接按 DCT 缩放到不小于格子尺寸
+            im.draft("RGB", (w, h))
+            src = np.asarray(im.convert("RGB"))
 
-    y = 0
-    for row in resized_rows:
-        h, w = row.shape[0], row.shape[1]
-        if w > target_width:
-            row = cv2.resize(row, (target_width, h))
-        cw = row.shape[1]
-        offset = (target_width - cw) // 2
-        canvas[y:y + h, offset:offset + cw] = row
-        y += h + padding
+        canvas[y:y + h, x:x + w] = cv2.resize(src, (w, h), interpolation=cv2.INTER_AREA)
+        del src
 
     return Image.fromarray(canvas)
 
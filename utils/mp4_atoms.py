@@ -0,0 +1,193 @@
+import io
+import os
+import struct
+from datetime import datetime
+from typing import Iterator, Tuple
+
+# QuickTime / MP4 时间字段以 1904-01-01 UTC 为纪元
+MAC_EPOCH_OFFSET = 2082844800
+# 整个 moov 读入内存修改，超过该大小视为异常布局，交给 ffmpeg
+MAX_MOOV_BYTES = 64 * 1024 * 1024
+# QuickTime 用户数据文本的语言码（und）
+_UDTA_LANG_UND = 0x55C4
+# udta 中可能携带拍摄时间的 atom；快速路径只维护 moov/udta/©day
+_DATE_ATOMS = (b"\xa9day", b"\xa9dat", b"date")
+
+
+# =========================
+# box 遍历
+# =========================
+
+def iter_boxes(f, start: int, end: int) -> Iterator[Tuple[bytes, int, int, int]]:
+    """
+    遍历 [start, end) 范围内的同级 box，只读 box 头
+
+    :param f: 以二进制打开的文件对象
+    :param start: 起始偏移
+    :param end: 结束偏移（文件末尾可传文件大小）
+    :returns: 迭代 (box_type, offset, header_size, box_size)
+    """
+    offset = start
+    while offset + 8 <= end:
+        f.seek(offset)
+        header = f.read(8)
+        if len(header) < 8:
+            return
+        size, box_type = struct.unpack(">I4s", header)
+        header_size = 8
+        if size == 1:
+            size = struct.unpack(">Q", f.read(8))[0]
+            header_size = 16
+        elif size == 0:
+            size = end - offset
+        if size < header_size:
+            return
+        yield box_type, offset, header_size, size
+        offset += size
+
+
+def find_boxes(f, start: int, end: int, path: Tuple[bytes, ...]) -> Iterator[Tuple[int, int, int]]:
+    """
+    按路径查找 box，例如 (b"moov", b"trak", b"tkhd")，同名 box 全部返回
+
+    :returns: 迭代 (offset, header_size, box_size)
+    """
+    for box_type, offset, header_size, size in iter_boxes(f, start, end):
+        if box_type != path[0]:
+            continue
+        if len(path) == 1:
+            yield offset, header_size, size
+        else:
+            yield from find_boxes(f, offset + header_size, offset + size, path[1:])
+
+
+# =========================
+# creation_time 原地修改
+# =========================
+
+def _patch_time_fields(moov: bytearray, moov_header: int, mac_ts: int) -> int:
+    """
+    在内存中的 moov 上改写 mvhd / tkhd / mdhd 的 creation_time 与 modification_time
+
+    :returns: 修改的 box 数
+    """
+    buf = io.BytesIO(moov)
+    end = len(moov)
+    patched = 0
+    for path in ((b"mvhd",), (b"trak", b"tkhd"), (b"trak", b"mdia", b"mdhd")):
+        for offset, header_size, _ in find_boxes(buf, moov_header, end, path):
+            body = offset + header_size
+            version = moov[body]
+            if version == 1:
+                struct.pack_into(">QQ", moov, body + 4, mac_ts, mac_ts)
+            elif mac_ts < 2 ** 32:
+                struct.pack_into(">II", moov, body + 4, mac_ts, mac_ts)
+            else:
+                continue
+            patched += 1
+    return patched
+
+
+def _has_other_dates(moov: bytes, start: int, end: int, top: bool = True) -> bool:
+    """
+    moov 中是否有快速路径改不到的时间元数据：任意 meta（mdta 键值如 com.apple.quicktime.creationdate、
+    udta/meta/ilst 等）、轨道级 udta 日期，或 moov/udta/©day 以外的日期 atom。
+    ffmpeg 的 -map_metadata -1 会把这些全部去掉，快速路径遇到时不能保留旧值，交给 ffmpeg 处理
+    """
+    buf = io.BytesIO(moov)
+    for box_type, offset, header_size, size in iter_boxes(buf, start, end):
+        if box_type == b"meta":
+            return True
+        if box_type == b"udta":
+            for child, _, _, _ in iter_boxes(buf, offset + header_size, offset + size):
+                if child == b"meta" or (child in _DATE_ATOMS and not (top and child == b"\xa9day")):
+                    return True
+        elif box_type == b"trak" and top:
+            if _has_other_dates(moov, offset + header_size, offset + size, top=False):
+                return True
+    return False
+
+
+def _udta_day_box(value: str) -> bytes:
+    """QuickTime 用户数据 ©day：size, type, 文本长度(2), 语言(2), 文本"""
+    text = value.encode("utf-8")
+    return struct.pack(">I4sHH", 12 + len(text), b"\xa9day", len(text), _UDTA_LANG_UND) + text
+
+
+def _rebuild_moov_with_day(moov: bytes, moov_header: int, day_box: bytes) -> bytes:
+    """重建 moov：在 udta 中替换 / 新增 ©day，其它子 box 原样保留"""
+    buf = io.BytesIO(moov)
+    children = []
+    udta = None
+    for box_type, offset, header_size, size in iter_boxes(buf, moov_header, len(moov)):
+        if box_type == b"udta" and udta is None and header_size == 8:
+            kept = [
+                moov[o:o + s]
+                for t, o, h, s in iter_boxes(buf, offset + header_size, offset + size)
+                if t != b"\xa9day"
+            ]
+            udta = b"".join(kept) + day_box
+            children.append(struct.pack(">I4s", 8 + len(udta), b"udta") + udta)
+        else:
+            children.append(moov[offset:offset + size])
+
+    if udta is None:
+        children.append(struct.pack(">I4s", 8 + len(day_box), b"udta") + day_box)
+
+    body = b"".join(children)
+    return struct.pack(">I4s", 8 + len(body), b"moov") + body
+
+
+def patch_mp4_creation_time(path: str, when: datetime) -> bool:
+    """
+    只读写 moov 原地修改 MP4 / MOV 的创建时间，不拷贝媒体数据
+
+    - mvhd / tkhd / mdhd 的 creation_time、modification_time 改为 when（UTC 秒）；
+    - udta/©day 写入带时区的 ISO8601 字符串：已有同长度 ©day 时原地覆盖，
+      否则在 moov 位于文件末尾时追加新 moov，再把旧 moov 改名为 free（单次 4 字节写入，中途崩溃时旧 moov 仍有效）。
+
+    :param path: 视频路径
+    :param when: 带时区的时间
+    :returns: 已修改返回 True；布局需要移动 mdat（moov 不在末尾且需要扩容）、moov 中带 meta 或其它日期 atom
+        等情况返回 False，文件不变
+    """
+    mac_ts = int(when.timestamp()) + MAC_EPOCH_OFFSET
+    day_box = _udta_day_box(when.isoformat(timespec="seconds"))
+    size = os.path.getsize(path)
+
+    with open(path, "r+b") as f:
+        found = next(find_boxes(f, 0, size, (b"moov",)), None)
+        if found is None:
+            return False
+        moov_offset, moov_header, moov_size = found
+        if moov_header != 8 or moov_size > MAX_MOOV_BYTES:
+            return False
+
+        f.seek(moov_offset)
+        moov = bytearray(f.read(moov_size))
+        if len(moov) != moov_size or _has_other_dates(moov, moov_header, moov_size):
+            return False
+        if not _patch_time_fields(moov, moov_header, mac_ts):
+            return False
+
+        # 已有同长度 ©day：原地覆盖，moov 大小不变
+        buf = io.BytesIO(moov)
+        existing = next(find_boxes(buf, moov_header, moov_size, (b"udta", b"\xa9day")), None)
+        if existing and existing[2] == len(day_box):
+            moov[existing[0]:existing[0] + existing[2]] = day_box
+            f.seek(moov_offset)
+            f.write(moov)
+            return True
+
+        # 需要扩容：只有 moov 在文件末尾时可以不动 mdat
+        if moov_offset + moov_size != size:
+            return False
+
+        new_moov = _rebuild_moov_with_day(bytes(moov), moov_header, day_box)
+        f.seek(size)
+        f.write(new_moov)
+        f.flush()
+        os.fsync(f.fileno())
+        f.seek(moov_offset + 4)
+        f.write(b"free")
+    return True
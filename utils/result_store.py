@@ -0,0 +1,85 @@
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Optional, Tuple
+
+from config import RESULT_STORE_ENABLED, RESULT_STORE_MAX_BYTES, RESULT_STORE_TTL_SECONDS
+from utils.file_response import file_etag
+
+
+class ResultStore:
+    """
+    进程内 TTL 结果缓存：刚生成的水印图片先放内存，供手机端随后的一两次拉取直接命中
+
+    - 同一 worker 内多线程共享，总字节数受 max_bytes 约束，超出时淘汰最早写入的条目；
+    - 只是读缓存：调用方必须在返回 URL 之前把文件写好，未命中（其它 worker、过期、重启）时回落到磁盘；
+    - ETag / Last-Modified 取自写好的文件的 stat，与磁盘路径返回的头一致，换 worker 命中也能 304。
+    """
+
+    def __init__(self, ttl: float = RESULT_STORE_TTL_SECONDS, max_bytes: int = RESULT_STORE_MAX_BYTES):
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self._items: "OrderedDict[str, Tuple[bytes, float, str, float]]" = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+
+    def _expire(self, now: float) -> None:
+        # TTL 固定，插入顺序即过期顺序
+        while self._items:
+            key, (data, expires_at, _, _) = next(iter(self._items.items()))
+            if expires_at > now and self._bytes <= self.max_bytes:
+                break
+            self._items.popitem(last=False)
+            self._bytes -= len(data)
+
+    def put(self, key: str, data: bytes, stat: os.stat_result) -> None:
+        """
+        放入内存（对应文件应已写好）
+
+        :param key: 查询键（image_id）
+        :param data: 文件字节
+        :param stat: 已写好文件的 os.stat 结果，用于 ETag / Last-Modified
+        """
+        if len(data) > self.max_bytes:
+            return
+        now = time.time()
+        with self._lock:
+            old = self._items.pop(key, None)
+            if old:
+                self._bytes -= len(old[0])
+            self._items[key] = (data, now + self.ttl, file_etag(stat), stat.st_mtime)
+            self._bytes += len(data)
+            self._expire(now)
+
+    def get(self, key: str) -> Optional[Tuple[bytes, str, float]]:
+        """
+        :returns: (data, etag, mtime)；未命中或已过期返回 None
+        """
+        with self._lock:
+            self._expire(time.time())
+            item = self._items.get(key)
+        if item is None:
+            return None
+        data, _, etag, mtime = item
+        return data, etag, mtime
+
+
+_store: Optional[ResultStore] = None
+_store_pid: Optional[int] = None
+_store_lock = threading.Lock()
+
+
+def get_result_store() -> Optional[ResultStore]:
+    """获取当前进程的结果缓存；RESULT_STORE_ENABLED 关闭时返回 None"""
+    global _store, _store_pid
+
+    if not RESULT_STORE_ENABLED:
+        return None
+
+    with _store_lock:
+        if _store is None or _store_pid != os.getpid():
+            _store = ResultStore()
+            _store_pid = os.getpid()
+        return _store
+
@@ -0,0 +1,259 @@
+import os
+import shutil
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from typing import Dict, List, Optional, Sequence, Tuple
+
+from config import TZ, REVIEW_BATCH_WORKERS
+from db import ReviewItem
+from utils.logger import log_line
+from utils.storage import find_review_dir_by_filename
+
+REVIEW_ROOT = os.path.join("storage", "reviews")
+REVIEW_STATUSES = ("pending", "approve", "reject")
+
+
+def normalize_file_path(file_path: str) -> str:
+    """统一为带前导 / 的 Unix 风格业务路径"""
+    return "/" + file_path.replace("\\", "/").lstrip("/")
+
+
+def review_dir(status: str, file_path: str) -> str:
+    """业务路径在某个审核状态下对应的目录，例如 storage/reviews/pending/aaa/bbb/video.mp4"""
+    return os.path.join(REVIEW_ROOT, status, file_path.replace("\\", "/").lstrip("/"))
+
+
+def record_review(filename: str, file_path: str, status: str = "pending") -> None:
+    """登记（或重置）一条审核文件"""
+    now = datetime.now(TZ)
+    (
+        ReviewItem
+        .insert(filename=filename, file_path=normalize_file_path(file_path), status=status,
+                created_at=now, updated_at=now)
+        .on_conflict(update={ReviewItem.status: status, ReviewItem.updated_at: now})
+        .execute()
+    )
+
+
+def _scan_pending_for(filename: str) -> Optional[str]:
+    """索引未命中时的兜底：遍历 pending 目录查找文件，找到后补登记"""
+    try:
+        root = find_review_dir_by_filename(filename)
+    except FileNotFoundError:
+        return None
+
+    rel_dir = os.path.relpath(root, os.path.join(REVIEW_ROOT, "pending")).replace("\\", "/")
+    file_path = normalize_file_path("" if rel_dir == "." else rel_dir)
+    # 同目录的文件会随目录一起移动，一并登记
+    for name in os.listdir(root):
+        record_review(name, file_path)
+    return file_path
+
+
+def find_pending_file_path(filename: str) -> Optional[str]:
+    """
+    按审核文件名查找其所属业务路径
+
+    :param filename: 审核文件名
+    :returns: 业务路径；不存在返回 None
+    """
+    item = (
+        ReviewItem
+        .select(ReviewItem.file_path)
+        .where(ReviewItem.filename == filename, ReviewItem.status == "pending")
+        .first()
+    )
+    if item and os.path.isdir(review_dir("pending", item.file_path)):
+        return item.file_path
+    return _scan_pending_for(filename)
+
+
+def move_review(filename: str, status: str) -> Tuple[str, str]:
+    """
+    审核通过 / 拒绝：把文件所在业务目录整体从 pending 移动到目标状态目录
+
+    :param filename: 审核文件名
+    :param status: approve / reject
+    :returns: (from_rel, to_rel)，相对于 storage/reviews
+    :raises FileNotFoundError: 没找到对应文件
+    """
+    file_path = find_pending_file_path(filename)
+    if file_path is None:
+        raise FileNotFoundError(f"未找到文件: {filename}")
+
+    result = _move_dir(file_path, status)
+    _mark_moved([file_path], status)
+    return result
+
+
+def _move_dir(file_path: str, status: str) -> Tuple[str, str]:
+    """只做文件系统移动，不访问数据库（可在线程池中执行）"""
+    src_dir = review_dir("pending", file_path)
+    dst_dir = review_dir(status, file_path)
+    os.makedirs(os.path.dirname(dst_dir), exist_ok=True)
+    shutil.move(src_dir, dst_dir)
+
+    rel = file_path.lstrip("/")
+    return f"pending/{rel}", f"{status}/{rel}"
+
+
+def _mark_moved(file_paths: Sequence[str], status: str) -> None:
+    if not file_paths:
+        return
+    (
+        ReviewItem
+        .update(status=status, updated_at=datetime.now(TZ))
+        .where(ReviewItem.file_path.in_(list(file_paths)), ReviewItem.status == "pending")
+        .execute()
+    )
+
+
+def _rmtree_approved(file_path: str) -> None:
+    target_dir = review_dir("approve", file_path)
+    try:
+        if os.path.exists(target_dir):
+            shutil.rmtree(target_dir)
+    except Exception as e:
+        # 不抛错，只记录
+        log_line(f"[ERROR] 审核记录删除失败: {target_dir} -> {e}")
+
+
+def clear_approved(file_path: str) -> None:
+    """删除审核通过的业务目录及其索引"""
+    file_path = normalize_file_path(file_path)
+    _rmtree_approved(file_path)
+    ReviewItem.delete().where(ReviewItem.file_path == file_path, ReviewItem.status == "approve").execute()
+
+
+# =========================
+# 批量操作
+# =========================
+
+_executor: Optional[ThreadPoolExecutor] = None
+_executor_lock = threading.Lock()
+
+
+def _get_executor() -> ThreadPoolExecutor:
+    """批量移动 / 删除共用的有界线程池（只做文件系统操作）"""
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(max_workers=REVIEW_BATCH_WORKERS, thread_name_prefix="review-batch")
+        return _executor
+
+
+def move_reviews(filenames: Sequence[str], status: str) -> List[dict]:
+    """
+    批量审核通过 / 拒绝
+
+    一次查询定位全部文件所属业务路径，同一业务目录只移动一次；目录移动并发执行，
+    最后一条 UPDATE 更新索引状态。
+
+    :param filenames: 审核文件名列表
+    :param status: approve / reject
+    :returns: 与入参顺序一致的结果列表，每项 {filename, ok, from, to} 或 {filename, ok, error}
+    """
+    rows = (
+        ReviewItem
+        .select(ReviewItem.filename, ReviewItem.file_path)
+        .where(ReviewItem.filename.in_(list(filenames)), ReviewItem.status == "pending")
+    )
+    path_of: Dict[str, str] = {row.filename: row.file_path for row in rows}
+    for name in filenames:
+        if name not in path_of or not os.path.isdir(review_dir("pending", path_of[name])):
+            file_path = _scan_pending_for(name)
+            if file_path:
+                path_of[name] = file_path
+            else:
+                path_of.pop(name, None)
+
+    file_paths = sorted(set(path_of.values()))
+    futures = {fp: _get_executor().submit(_move_dir, fp, status) for fp in file_paths}
+
+    moved = {}
+    errors = {}
+    for fp, future in futures.items():
+        try:
+            moved[fp] = future.result()
+        except Exception as e:
+            errors[fp] = str(e)
+    _mark_moved(list(moved), status)
+
+    results = []
+    for name in filenames:
+        fp = path_of.get(name)
+        if fp is None:
+            results.append({"filename": name, "ok": False, "error": f"未找到文件: {name}"})
+        elif fp in moved:
+            src, dst = moved[fp]
+            results.append({"filename": name, "ok": True, "from": src, "to": dst})
+        else:
+            results.append({"filename": name, "ok": False, "error": errors[fp]})
+    return results
+
+
+def clear_approved_many(file_paths: Sequence[str]) -> List[dict]:
+    """
+    批量清除审核通过的业务目录，目录删除并发执行，索引一条 DELETE 删除
+
+    :param file_paths: 业务路径列表
+    :returns: 每项 {file_path, ok}
+    """
+    normalized = [normalize_file_path(fp) for fp in file_paths]
+    list(_get_executor().map(_rmtree_approved, set(normalized)))
+    if normalized:
+        ReviewItem.delete().where(ReviewItem.file_path.in_(normalized), ReviewItem.status == "approve").execute()
+    return [{"file_path": fp, "ok": True} for fp in file_paths]
+
+
+def list_pending(page: Optional[int] = None, page_size: Optional[int] = None) -> Tuple[List[ReviewItem], int]:
+    """
+    待审核文件列表，按登记顺序；page 为 None 时返回全部
+
+    :returns: (items, total)
+    """
+    query = ReviewItem.select().where(ReviewItem.status == "pending").order_by(ReviewItem.id)
+    total = query.count()
+    if page is not None:
+        query = query.paginate(page, page_size or 100)
+    return list(query), total
+
+
+def list_approved_paths(page: Optional[int] = None, page_size: Optional[int] = None) -> Tuple[List[str], int]:
+    """
+    审核通过的业务路径（去重、排序）；page 为 None 时返回全部
+
+    :returns: (file_paths, total)
+    """
+    query = (
+        ReviewItem
+        .select(ReviewItem.file_path)
+        .where(ReviewItem.status == "approve")
+        .distinct()
+        .order_by(ReviewItem.file_path)
+    )
+    total = query.count()
+    if page is not None:
+        query = query.paginate(page, page_size or 100)
+    return [row.file_path for row in query], total
+
+
+def rebuild_review_index() -> int:
+    """
+    遍历 storage/reviews 重建审核索引（建表后首次回填 / 手工修复用）
+
+    :returns: 登记的文件数
+    """
+    count = 0
+    for status in REVIEW_STATUSES:
+        base = os.path.join(REVIEW_ROOT, status)
+        for root, _, files in os.walk(base):
+            rel_dir = os.path.relpath(root, base).replace("\\", "/")
+            if rel_dir == "." or not files:
+                continue
+            for name in files:
+                record_review(name, rel_dir, status)
+                count += 1
+    log_line(f"[INFO] 审核索引重建完成: {count} 个文件")
+    return count
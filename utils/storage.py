@@ -1,12 +1,16 @@
 import os
 import random
+import shutil
 import string
+import struct
 import subprocess
 from datetime import datetime
 
 from PIL import Image, ExifTags
 
 from config import BASE_URL, TZ
+from utils.jpeg_exif import patch_exif_datetime_in_place, rewrite_exif_datetime_segment
+from utils.mp4_atoms import patch_mp4_creation_time
 
 
 def get_local_iso8601():
@@ -26,6 +30,18 @@ def generate_random_suffix(length: int = 8) -> str:
     return ''.join(random.choices(string.ascii_lowercase + string.digits, k=length))
 
 
+def write_file_atomic(path: str, data: bytes) -> None:
+    """先写临时文件再原子替换，其它 worker 不会读到半个文件"""
+    tmp_path = f"{path}.{generate_random_suffix()}.tmp"
+    try:
+        with open(tmp_path, "wb") as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+
+
 def get_image_url(image_id: str, image_type: str = 'gallery') -> str:
     return f"{BASE_URL}/api/image/{image_type}/{image_id}"
 
@@ -54,40 +70,83 @@ def get_random_template_file(category, sub_category=None):
 
 
 def update_exif_datetime(image_path: str):
-    """用 Pillow 修改 JPEG 图片 EXIF 时间为当前时间"""
+    """
+    修改 JPEG 图片 EXIF 时间（DateTime / DateTimeOriginal / DateTimeDigitized）为当前时间
+
+    依次尝试：原地覆盖标签字节 -> 只重建 APP1 段 -> Pillow 整图重存（非 JPEG 兜底），
+    前两种都不解码 / 重编码像素。
+    """
+    now_str = datetime.now(TZ).strftime("%Y:%m:%d %H:%M:%S")
     try:
-        img = Image.open(image_path)
-        exif = img.getexif()
-        now_str = datetime.now(TZ).strftime("%Y:%m:%d %H:%M:%S")
-
-        # 找到 DateTime、DateTimeOriginal、DateTimeDigitized 的 tag ID
-        TAGS = {v: k for k, v in ExifTags.TAGS.items()}
-        for tag_name in ["DateTime", "DateTimeOriginal", "DateTimeDigitized"]:
-            tag_id = TAGS.get(tag_name)
-            if tag_id:
-                exif[tag_id] = now_str
-
-        img.save(image_path, exif=exif)
-        print(f"EXIF 时间更新为 {now_str}")
+        if patch_exif_datetime_in_place(image_path, now_str):
+            mode = "in-place"
+        elif rewrite_exif_datetime_segment(image_path, now_str):
+            mode = "app1"
+        else:
+            _update_exif_datetime_pillow(image_path, now_str)
+            mode = "pillow"
+        print(f"EXIF 时间更新为 {now_str}（{mode}）")
     except Exception as e:
         print(f"EXIF 更新时间失败: {e}")
 
 
-def fix_video_metadata(src_path: str, dst_path: str) -> None:
+def _update_exif_datetime_pillow(image_path: str, now_str: str):
+    """用 Pillow 重新保存整张图片写入 EXIF 时间（会重编码，仅作非 JPEG 兜底）"""
+    img = Image.open(image_path)
+    exif = img.getexif()
+
+    # 找到 DateTime、DateTimeOriginal、DateTimeDigitized 的 tag ID
+    TAGS = {v: k for k, v in ExifTags.TAGS.items()}
+    for tag_name in ["DateTime", "DateTimeOriginal", "DateTimeDigitized"]:
+        tag_id = TAGS.get(tag_name)
+        if tag_id:
+            exif[tag_id] = now_str
+
+    img.save(image_path, exif=exif)
+
+
+def fix_video_metadata(src_path: str, dst_path: str = None, keep_src: bool = True) -> None:
     """
     去除所有 Stream 层 creation_time，并写入带时区的容器层 creation_time，
     确保 Immich 使用本地时区(+08:00)而不是 UTC。
 
+    原地修改时优先走纯 Python 快速路径：只改写 moov 中的 mvhd/tkhd/mdhd 时间与 udta/©day，不拷贝媒体数据；
+    布局需要移动 mdat、或 moov 中带 meta / 其它日期 atom（需要 ffmpeg 清除）时才回退到 ffmpeg -c copy。
+    输出到 dst_path 且需要保留源文件时，直接由 ffmpeg 从 src_path 写出 dst_path，不先整文件拷贝一遍。
+
+    注意：keep_src 默认为 True，因此 fix_video_metadata(src, dst) 两参数调用总是走 ffmpeg；
+    调用方不再需要源文件时应传 keep_src=False，才能走 rename + 快速路径。
+
     :param src_path: 输入视频文件
-    :param dst_path: 输出视频文件（写入新 metadata 后）
+    :param dst_path: 输出视频文件（写入新 metadata 后）；为空或与 src_path 相同时原地修改
+    :param keep_src: dst_path 不同于 src_path 时是否保留源文件；False 时先把源文件 rename 为 dst_path 再原地修改
     :returns: None
     :raises RuntimeError: ffmpeg 执行失败时抛出异常
     """
     now = datetime.now(TZ).astimezone()
     timestamp = now.isoformat(timespec="seconds")  # 例如 2025-11-14T12:43:49+08:00
 
+    in_place = not dst_path or os.path.abspath(dst_path) == os.path.abspath(src_path)
+    if not in_place and not keep_src:
+        # 调用方不再需要源文件：同一文件系统内 rename，不拷贝数据
+        shutil.move(src_path, dst_path)
+        src_path = dst_path
+        in_place = True
+    target = src_path if in_place else dst_path
+
+    if in_place:
+        try:
+            if patch_mp4_creation_time(target, now):
+                return
+        except (OSError, struct.error, ValueError):
+            pass
+
+    # ffmpeg 不能原地输出，先写到目标旁的临时文件再替换
+    out_path = f"{target}.{generate_random_suffix()}.tmp{os.path.splitext(target)[1]}"
+
     cmd = [
         "ffmpeg",
+        "-y",
         "-i", src_path,
 
         # 删除所有 metadata（关键，必须保留）
@@ -101,14 +160,17 @@ def fix_video_metadata(src_path: str, dst_path: str) -> None:
         # 不重编码（极快）
         "-c", "copy",
 
-        dst_path,
+        out_path,
     ]
 
     proc = subprocess.run(cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
     if proc.returncode != 0:
+        if os.path.exists(out_path):
+            os.remove(out_path)
         raise RuntimeError(
             f"ffmpeg 修改视频 metadata 失败: {proc.stderr.decode(errors='ignore')}"
         )
+    os.replace(out_path, target)
 
 
 def find_review_dir_by_filename(filename):